@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+# Look for patterns that can make a matcher slow, before matching.
+#
+# Backtracking matchers, and nfa._match() when it does not dedupe its
+# paths, can try the same part of the input in many different ways
+# when the pattern can match it in many different ways. The shapes
+# that cause this are well known:
+#
+#   (a*)*  (a+)+    a repeated part that can match nothing, or that
+#                   ends with a loop over characters it starts with,
+#                   so each run of a's can be split up in
+#                   exponentially many ways
+#   (a|aa)*         alternatives that can start with the same
+#                   character, repeated
+#   a*a*   a*(a|b)* loops next to each other that can match the same
+#                   characters, each adding a power of n to the time
+#
+# The postfix tokens from nfa.postfix() are evaluated with a stack,
+# the same way prefilter.py does, with each entry describing the
+# shape of one subexpression. The checks only look at the shape, so
+# they can warn about patterns that turn out to be safe, like (a|ab)*.
+#
+# To pick an engine, the DFA is built with a limit on the number of
+# states. If it fits, a DFA runs in linear time no matter what the
+# pattern looks like. If not, the Pike VM runs in time proportional to
+# the length of the input times the size of the pattern. Backtracking
+# is only suggested for patterns that need the syntax of pike.py.
+#
+# Run "python3 analyze.py PATTERN..." to see the results.
+
+import collections
+import sys
+
+import bitparallel
+import dfa
+import lazydfa
+import matchers
+import nfa
+
+# Issue severities
+EXPONENTIAL = 'exponential'
+POLYNOMIAL = 'polynomial'
+
+# Engine kinds
+DFA = 'dfa'
+THOMPSON = 'thompson'
+BACKTRACKING = 'backtracking'
+
+# A DFA with more states than this is not worth building. The lazy DFA
+# used by nfa.compile(engine='dfa') starts over when its cache holds
+# this many states.
+DEFAULT_DFA_LIMIT = lazydfa.DEFAULT_MAX_STATES
+
+# Something that may make a matcher slow. pos is the position in the
+# pattern of the quantifier involved.
+Issue = collections.namedtuple('Issue', ['severity', 'pos', 'message'])
+
+# The shape of one subexpression. first is the set of characters a
+# match can start with. head and tail map the characters of the loops
+# that can be at the start or the end of a match to the position of
+# the quantifier. ambiguous is the set of characters more than one
+# alternative can start with, outside of any loop.
+Shape = collections.namedtuple(
+    'Shape', ['nullable', 'first', 'head', 'tail', 'ambiguous'])
+
+
+class DangerousPattern(ValueError):
+    "Raised by check() for patterns that can take exponential time."
+
+
+class Analysis:
+    """What analyze() found out about a pattern.
+
+    kind is DFA, THOMPSON, or BACKTRACKING, and engine names the
+    matcher in matchers.py to use. reason explains the choice.
+    Patterns with issues can still be safe to run with the engine
+    recommended, as long as it is not a backtracking one.
+    """
+
+    def __init__(self, pattern, issues, positions, nfa_states,
+                 dfa_states, dfa_limit):
+        self.pattern = pattern
+        self.issues = issues
+        # The number of literal characters, which is the number of
+        # states of the Glushkov automaton used by bitparallel.py.
+        self.positions = positions
+        # The number of states in the Thompson NFA (see program.py).
+        self.nfa_states = nfa_states
+        # The number of states in the minimized DFA, or None if there
+        # would be more than dfa_limit.
+        self.dfa_states = dfa_states
+        self.dfa_limit = dfa_limit
+        self.kind, self.engine, self.reason = self._recommend()
+
+    def __repr__(self):
+        return 'Analysis({!r}, issues={}, engine={!r})'.format(
+            self.pattern, len(self.issues), self.engine)
+
+    @property
+    def exponential(self):
+        "True if backtracking may take exponential time."
+        return any(i.severity == EXPONENTIAL for i in self.issues)
+
+    def _recommend(self):
+        pikevm = matchers.by_name('pikevm')
+        iterative = matchers.by_name('pike-iterative')
+        if not matchers.supports(pikevm, self.pattern) and \
+           matchers.supports(iterative, self.pattern):
+            # The other engines take . ^ and $ literally.
+            return (BACKTRACKING, 'pike-iterative',
+                    'only pike.py handles . ^ and $, and this version '
+                    'never tries the same state twice')
+        if self.dfa_states is not None:
+            if self.positions <= bitparallel.MAX_POSITIONS:
+                return (DFA, 'bitparallel',
+                        '{} positions fit in a machine word'.format(
+                            self.positions))
+            return (DFA, 'dfa', 'the DFA needs only {} states'.format(
+                self.dfa_states))
+        # Even without any issues, backtracking is not faster: the
+        # matchers in recursive_descent.py treat choice and repetition
+        # the way parsing expression grammars do, so they may not find
+        # the same matches, and they start over at every position.
+        return (THOMPSON, 'pikevm',
+                'the DFA needs more than {} states'.format(self.dfa_limit))
+
+
+def shapes(tokens):
+    """Evaluate the postfix tokens, returning the Shape of the whole
+    pattern and the Issues found."""
+    issues = []
+    stack = []
+    for t in tokens:
+        if t.op == nfa.LITERAL:
+            stack.append(Shape(False, frozenset(t.text), {}, {},
+                               frozenset()))
+
+        elif t.op == nfa.CONCAT:
+            b = stack.pop()
+            a = stack.pop()
+            # A loop that can end a followed by one that can start b
+            # over the same characters can split a run of them at any
+            # point.
+            for c in sorted(set(a.tail) & set(b.head)):
+                issues.append(Issue(
+                    POLYNOMIAL, b.head[c],
+                    'loops next to each other can both match {!r}'
+                    .format(c)))
+            head = dict(a.head)
+            tail = dict(b.tail)
+            first = a.first
+            if a.nullable:
+                head.update(b.head)
+                first = first | b.first
+            if b.nullable:
+                tail.update(a.tail)
+            stack.append(Shape(a.nullable and b.nullable, first, head,
+                               tail, a.ambiguous | b.ambiguous))
+
+        elif t.op == nfa.ALTERNATE:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(Shape(
+                a.nullable or b.nullable,
+                a.first | b.first,
+                {**b.head, **a.head},
+                {**b.tail, **a.tail},
+                a.ambiguous | b.ambiguous | (a.first & b.first),
+            ))
+
+        elif t.op in (nfa.AT_LEAST_ZERO, nfa.AT_LEAST_ONE):
+            a = stack.pop()
+            if a.nullable:
+                issues.append(Issue(
+                    EXPONENTIAL, t.pos,
+                    'the repeated part can match nothing'))
+            else:
+                for c in sorted(set(a.tail) & a.first):
+                    issues.append(Issue(
+                        EXPONENTIAL, t.pos,
+                        'the repeated part can end with a loop over '
+                        '{!r}, which it can also start with'.format(c)))
+            for c in sorted(a.ambiguous):
+                issues.append(Issue(
+                    EXPONENTIAL, t.pos,
+                    'alternatives that can both start with {!r} are '
+                    'repeated'.format(c)))
+            loop = {c: t.pos for c in a.first}
+            stack.append(Shape(
+                a.nullable or t.op == nfa.AT_LEAST_ZERO,
+                a.first,
+                {**loop, **a.head},
+                {**loop, **a.tail},
+                # Reported above, for this loop.
+                frozenset(),
+            ))
+
+        elif t.op == nfa.AT_MOST_ONE:
+            a = stack.pop()
+            stack.append(a._replace(nullable=True))
+
+        else:
+            raise ValueError('Unhandled token {}'.format(t))
+
+    if len(stack) != 1:
+        raise ValueError(stack)
+    return stack[0], issues
+
+
+def analyze(pattern, dfa_limit=DEFAULT_DFA_LIMIT):
+    "Return an Analysis of pattern."
+    p = nfa.Pattern(pattern)
+    shape, issues = shapes(p.postfix)
+    positions = sum(1 for t in p.postfix if t.op == nfa.LITERAL)
+    try:
+        dfa_states = dfa.from_program(
+            p.program, unanchored=True, max_states=dfa_limit).nstates
+    except dfa.TooManyStates:
+        dfa_states = None
+    return Analysis(pattern, issues, positions, len(p.program),
+                    dfa_states, dfa_limit)
+
+
+def check(pattern, dfa_limit=DEFAULT_DFA_LIMIT):
+    """Return the Analysis of pattern, or raise DangerousPattern if a
+    backtracking matcher could take exponential time on it."""
+    analysis = analyze(pattern, dfa_limit)
+    if analysis.exponential:
+        issue = next(i for i in analysis.issues
+                     if i.severity == EXPONENTIAL)
+        raise DangerousPattern('{!r} at {}: {}'.format(
+            pattern, issue.pos, issue.message))
+    return analysis
+
+
+def _report(analysis):
+    print(analysis.pattern)
+    for issue in analysis.issues:
+        print('  {:>4}  {:11}  {}'.format(
+            issue.pos, issue.severity, issue.message))
+    print('  positions: {}  NFA states: {}  DFA states: {}'.format(
+        analysis.positions, analysis.nfa_states,
+        '>{}'.format(analysis.dfa_limit) if analysis.dfa_states is None
+        else analysis.dfa_states))
+    print('  use {} ({}): {}'.format(
+        analysis.engine, analysis.kind, analysis.reason))
+
+
+if __name__ == '__main__':
+    for pattern in sys.argv[1:]:
+        _report(analyze(pattern))
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+# Time every matcher in this directory on the same patterns and inputs.
+#
+# Each case gives a pattern and an input for several input lengths, so
+# the results show how the time grows as well as how long one search
+# takes. The cases include realistic ones (searching logs, inputs with
+# no match) and ones known to be slow for backtracking matchers, like
+# (a*)*b and a?^n a^n.
+#
+# Each engine (see matchers.py) only runs the cases written in the
+# syntax it supports.
+# The time for one search is repeated to give percentiles, and the
+# peak memory is measured separately with tracemalloc, because
+# tracing allocations slows the code down.
+#
+# Run "python3 benchmark.py --help" for the options. The --json output
+# can be compared with another run using compare.py.
+
+import argparse
+import collections
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+import matchers
+
+# Stop trying longer inputs for an engine once one search takes, or is
+# expected to take, more than this many seconds.
+DEFAULT_BUDGET = 0.5
+DEFAULT_REPEAT = 5
+
+
+# pattern(n) and text(n) build the pattern and input for length n.
+Case = collections.namedtuple('Case', ['name', 'pattern', 'text',
+                                       'lengths'])
+
+
+def _log(n):
+    line = 'INFO request served in 12ms from cache\n'
+    return (line * (n // len(line) + 1))[:n - 16] + 'ERROR disk full\n'
+
+
+CASES = [
+    Case('literal-no-match',
+         lambda n: 'needle',
+         lambda n: ('haystack ' * (n // 9 + 1))[:n],
+         [100, 1000, 10000]),
+    Case('log-search',
+         lambda n: 'ERROR (disk|net)',
+         _log,
+         [100, 1000, 10000]),
+    Case('groups',
+         lambda n: 'a(bb)*a(c|d|e|fg)hij',
+         lambda n: 'x' * (n - 11) + 'abbbbafghij',
+         [100, 1000, 10000]),
+    # The required literal is at the end, after text that almost
+    # matches, so the prefilter cannot skip the work.
+    Case('stars',
+         lambda n: 'a*a*a*a*c',
+         lambda n: 'a' * (n - 2) + 'bc',
+         [10, 30, 100, 300, 1000]),
+    Case('nested-star',
+         lambda n: '(a*)*b',
+         lambda n: 'a' * (n - 2) + 'cb',
+         [10, 30, 100, 300, 1000]),
+    Case('alternation-star',
+         lambda n: '(a|aa)*b',
+         lambda n: 'a' * (n - 2) + 'cb',
+         [10, 20, 40, 80]),
+    Case('optional-n',
+         lambda n: 'a?' * n + 'a' * n,
+         lambda n: 'a' * n,
+         [4, 6, 8, 10, 12]),
+]
+
+
+def percentile(times, q):
+    "Return the q percentile (0-100) of times, by nearest rank."
+    ordered = sorted(times)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(search, text, repeat):
+    "Return the times for repeat searches and the peak memory used."
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search(text)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        search(text)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def run(cases=CASES, engines=matchers.ENGINES, repeat=DEFAULT_REPEAT,
+        budget=DEFAULT_BUDGET, report=None):
+    """Run the benchmarks and return a list of result dicts.
+
+    report is called with each result as it is finished.
+    """
+    results = []
+    for case in cases:
+        for engine in engines:
+            points = []
+            for n in case.lengths:
+                pattern = case.pattern(n)
+                if not matchers.supports(engine, pattern):
+                    break
+                if _predict(points, n) > budget * 10:
+                    # Some engines take exponential time on these
+                    # cases, so do not wait to find out.
+                    break
+                text = case.text(n)
+                result = {
+                    'case': case.name,
+                    'engine': engine.name,
+                    'pattern': pattern,
+                    'length': len(text),
+                }
+                try:
+                    search = engine.factory(pattern)
+                    # One search first, to see if the rest would take
+                    # too long.
+                    start = time.perf_counter()
+                    search(text)
+                    first = time.perf_counter() - start
+                    if first > budget:
+                        times, peak = [first], None
+                        result['over_budget'] = True
+                    else:
+                        times, peak = measure(search, text, repeat)
+                except (RecursionError, IndexError, ValueError) as err:
+                    result['error'] = '{}: {}'.format(
+                        type(err).__name__, err)
+                    times, peak = [], None
+                result.update(_summarize(times, len(text), peak))
+                results.append(result)
+                if report is not None:
+                    report(result)
+                if 'error' in result or times[0] > budget:
+                    # Longer inputs would only be slower.
+                    break
+                points.append((n, min(times)))
+    return results
+
+
+def _predict(points, n):
+    """Guess the time for length n from the times for the last two
+    lengths, assuming time ~ length ** k.
+
+    With only one length to go on, assume the time is quadratic.
+    """
+    if not points:
+        return 0
+    n1, t1 = points[-1]
+    k = 2
+    if len(points) > 1:
+        n0, t0 = points[-2]
+        if t0 > 0 and t1 > t0:
+            k = max(math.log(t1 / t0) / math.log(n1 / n0), 1)
+    return t1 * (n / n1) ** k
+
+
+def _summarize(times, length, peak):
+    if not times:
+        return {'times': []}
+    mean = sum(times) / len(times)
+    return {
+        'times': times,
+        'mean': mean,
+        'p50': percentile(times, 50),
+        'p90': percentile(times, 90),
+        'p99': percentile(times, 99),
+        'throughput': length / mean if mean else None,
+        'peak_memory': peak,
+    }
+
+
+def scaling(results):
+    """Estimate how the median time grows with the input length.
+
+    Returns dicts with the lengths and median times for each case and
+    engine, and the exponent k in time ~ length ** k between the
+    shortest and the longest input.
+    """
+    curves = collections.OrderedDict()
+    for r in results:
+        if 'p50' in r:
+            key = (r['case'], r['engine'])
+            curves.setdefault(key, []).append((r['length'], r['p50']))
+    found = []
+    for (case, engine), points in curves.items():
+        exponent = None
+        (n0, t0), (n1, t1) = points[0], points[-1]
+        if n1 > n0 and t0 > 0 and t1 > 0:
+            exponent = math.log(t1 / t0) / math.log(n1 / n0)
+        found.append({
+            'case': case,
+            'engine': engine,
+            'lengths': [n for n, t in points],
+            'p50': [t for n, t in points],
+            'exponent': exponent,
+        })
+    return found
+
+
+def _print_result(r):
+    if 'error' in r:
+        print('{case:18} {engine:18} {length:>7} {error}'.format(**r),
+              flush=True)
+        return
+    peak = r['peak_memory']
+    print('{:18} {:18} {:>7} {:10.3f} {:10.3f} {:10.3f} {:12.0f} {:>10}'
+          .format(r['case'], r['engine'], r['length'],
+                  r['p50'] * 1000, r['p90'] * 1000, r['p99'] * 1000,
+                  r['throughput'] or 0,
+                  '-' if peak is None else '{:.1f}'.format(peak / 1024)),
+          flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time every matcher on the same patterns and inputs.')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='searches to time for each input')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='seconds one search may take before longer '
+                        'inputs are skipped')
+    parser.add_argument('--engine', action='append',
+                        help='only run this engine (may be repeated)')
+    parser.add_argument('--case', action='append',
+                        help='only run this case (may be repeated)')
+    parser.add_argument('--quick', action='store_true',
+                        help='only use the two shortest inputs')
+    args = parser.parse_args(argv)
+
+    engines = [e for e in matchers.ENGINES
+               if not args.engine or e.name in args.engine]
+    cases = [c for c in CASES if not args.case or c.name in args.case]
+    if args.quick:
+        cases = [c._replace(lengths=c.lengths[:2]) for c in cases]
+
+    print('{:18} {:18} {:>7} {:>10} {:>10} {:>10} {:>12} {:>10}'.format(
+        'case', 'engine', 'length', 'p50 ms', 'p90 ms', 'p99 ms',
+        'chars/s', 'peak KB'))
+    results = run(cases, engines, args.repeat, args.budget,
+                  report=_print_result)
+
+    print()
+    for curve in scaling(results):
+        if curve['exponent'] is not None:
+            print('{case:18} {engine:18} time ~ length ** {exponent:.2f}'
+                  .format(**curve))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.time(),
+                'repeat': args.repeat,
+                'results': results,
+                'scaling': scaling(results),
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
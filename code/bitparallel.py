@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# A bit-parallel simulation of the Glushkov automaton for a pattern,
+# in the style of the Shift-And algorithm.
+#
+# The Glushkov automaton has one state for each literal character in
+# the pattern (its "positions"), and no empty transitions. The set of
+# active positions fits in the bits of an int, so consuming a
+# character is a few table lookups and bitwise operations instead of
+# building a list of paths:
+#
+#   active = follow(active) & chars[c]
+#
+# where chars[c] has a bit set for every position that matches c, and
+# follow() is the union of the positions that can come after each
+# active one. Shift-And is the special case where follow() is a shift
+# by one bit, because each position can only be followed by the next.
+#
+# See "Flexible Pattern Matching in Strings" by Navarro and Raffinot,
+# chapter 5, for the construction and the follow tables.
+
+import nfa
+import tracing
+
+# Patterns with up to this many positions are run bit-parallel when
+# nfa.compile() is asked to choose the engine. Python ints can hold
+# larger sets, but each step does one table lookup per 8 positions.
+MAX_POSITIONS = 64
+
+# The follow() tables handle this many positions per lookup.
+BITS_PER_TABLE = 8
+
+
+class Glushkov:
+    """The positions of a pattern and how they may follow each other.
+
+    Each position is a bit. first is the mask of positions a match
+    can begin with and last the ones it can end with. follow[p] is the
+    mask of positions that can come right after position p.
+    """
+
+    def __init__(self, chars, first, last, follow):
+        self.chars = chars
+        self.first = first
+        self.last = last
+        self.follow = follow
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __repr__(self):
+        return 'Glushkov(positions={})'.format(len(self))
+
+
+def from_postfix(tokens):
+    "Build the Glushkov automaton from the output of nfa.postfix()."
+    chars = []
+    follow = []
+    # Each entry describes a subexpression with a tuple of
+    # (nullable, first, last). Like nfa.post2nfa(), the tokens are
+    # evaluated with a stack.
+    stack = []
+
+    def add_follow(mask, following):
+        p = 0
+        while mask:
+            if mask & 1:
+                follow[p] |= following
+            mask >>= 1
+            p += 1
+
+    for t in tokens:
+        if t.op == nfa.LITERAL:
+            bit = 1 << len(chars)
+            chars.append(t.text)
+            follow.append(0)
+            stack.append((False, bit, bit))
+
+        elif t.op == nfa.CONCAT:
+            b_nullable, b_first, b_last = stack.pop()
+            a_nullable, a_first, a_last = stack.pop()
+            add_follow(a_last, b_first)
+            first = a_first | (b_first if a_nullable else 0)
+            last = b_last | (a_last if b_nullable else 0)
+            stack.append((a_nullable and b_nullable, first, last))
+
+        elif t.op == nfa.ALTERNATE:
+            b_nullable, b_first, b_last = stack.pop()
+            a_nullable, a_first, a_last = stack.pop()
+            stack.append((a_nullable or b_nullable,
+                          a_first | b_first, a_last | b_last))
+
+        elif t.op in (nfa.AT_LEAST_ZERO, nfa.AT_LEAST_ONE):
+            nullable, first, last = stack.pop()
+            # Repeating lets the first positions follow the last ones.
+            add_follow(last, first)
+            if t.op == nfa.AT_LEAST_ZERO:
+                nullable = True
+            stack.append((nullable, first, last))
+
+        elif t.op == nfa.AT_MOST_ONE:
+            nullable, first, last = stack.pop()
+            stack.append((True, first, last))
+
+        else:
+            raise ValueError('Unhandled token {}'.format(t))
+
+    if len(stack) != 1:
+        raise ValueError(stack)
+    # Matches must consume at least one character, so whether the
+    # whole pattern is nullable does not matter.
+    nullable, first, last = stack[0]
+    return Glushkov(chars, first, last, follow)
+
+
+class BitParallel:
+    """Run a Glushkov automaton with the active positions as bits.
+
+    The match_end() and search_end() methods work like the ones of
+    lazydfa.LazyDFA. There is nothing to cache, so one object handles
+    both anchored and unanchored searches.
+    """
+
+    def __init__(self, glushkov):
+        self.glushkov = glushkov
+        self.first = glushkov.first
+        self.last = glushkov.last
+
+        # The positions that can match each character, by code point.
+        self.chars = {}
+        for p, c in enumerate(glushkov.chars):
+            code = ord(c)
+            self.chars[code] = self.chars.get(code, 0) | (1 << p)
+
+        # tables[k][byte] is the union of follow[p] for the positions
+        # p in that byte of the active set, starting at position
+        # k * BITS_PER_TABLE.
+        self.tables = []
+        follow = glushkov.follow
+        for base in range(0, len(follow), BITS_PER_TABLE):
+            table = [0] * (1 << BITS_PER_TABLE)
+            for byte in range(1, 1 << BITS_PER_TABLE):
+                # Reuse the entry without the lowest bit.
+                low = (byte & -byte).bit_length() - 1
+                p = base + low
+                table[byte] = table[byte & (byte - 1)] | (
+                    follow[p] if p < len(follow) else 0)
+            self.tables.append(table)
+
+    def _follow(self, active):
+        following = 0
+        for table in self.tables:
+            if not active:
+                break
+            following |= table[active & 0xff]
+            active >>= BITS_PER_TABLE
+        return following
+
+    def match_end(self, s, start):
+        """Return the end of the longest match beginning at start, or
+        -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        tracer = tracing.current.get()
+        chars = self.chars
+        last = self.last
+        active = 0
+        end = -1
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            code = s[i] if binary else ord(s[i])
+            if i == start:
+                active = self.first & chars.get(code, 0)
+            else:
+                active = self._follow(active) & chars.get(code, 0)
+            if not active:
+                # Nothing can match from here on.
+                break
+            if active & last:
+                end = i + 1
+        return end
+
+    def search_end(self, s, start):
+        """Return the end of the first match to finish at or after
+        start, or -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        tracer = tracing.current.get()
+        chars = self.chars
+        first = self.first
+        last = self.last
+        active = 0
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            code = s[i] if binary else ord(s[i])
+            # A match may begin at any position, so the first
+            # positions are always allowed.
+            active = (self._follow(active) | first) & chars.get(code, 0)
+            if active & last:
+                return i + 1
+        return -1
+
+
+def fits(glushkov):
+    "Return True if the automaton is small enough to run bit-parallel."
+    return len(glushkov) <= MAX_POSITIONS
+
+
+def _benchmark():
+    import timeit
+
+    cases = [
+        ('abc', 'abcx' * 100),
+        ('a(bb)*a(c|d|e|fg)hij', 'a' + 'bb' * 60 + 'afghij'),
+        ('(a|b)*abb', 'ab' * 60 + 'b'),
+        ('x(ab)*y', 'x' + 'ab' * 60 + 'y'),
+    ]
+    # nfa._match() uses recursion proportional to the length of the
+    # match, so the inputs are kept short.
+    print('{:24} {:>10} {:>10} {:>8}'.format(
+        'pattern', 'nfa', 'bitpar', 'speedup'))
+    for pattern, text in cases:
+        p = nfa.compile(pattern)
+        bp = BitParallel(from_postfix(p.postfix))
+        m = nfa._match(p.nfa, text, 0)
+        assert bp.match_end(text, 0) == (m.extents[0][1] if m else -1)
+        slow = min(timeit.repeat(
+            lambda: nfa._match(p.nfa, text, 0), number=10, repeat=3))
+        fast = min(timeit.repeat(
+            lambda: bp.match_end(text, 0), number=10, repeat=3))
+        print('{:24} {:10.5f} {:10.5f} {:7.1f}x'.format(
+            pattern, slow, fast, slow / fast))
+
+
+if __name__ == '__main__':
+    _benchmark()
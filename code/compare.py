@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# Find out whether a change made any of the matchers slower, by
+# comparing benchmark.py results with a saved baseline.
+#
+#   python3 compare.py save baseline.json      # before the change
+#   python3 compare.py check baseline.json     # after it
+#   python3 compare.py diff old.json new.json  # two saved runs
+#
+# "check" runs the same cases again, at the same input lengths and
+# without benchmark.py's time budget, so every cell is timed in full
+# even if it got much slower. A cell (one case, engine, and input
+# length) has regressed when its median time grew by more than the
+# threshold and a one-sided Mann-Whitney U test says the new times
+# are larger than the old ones, not just noisy. A cell that was timed
+# before has also regressed if it is missing from the new results,
+# fails, or went over the budget, since a single time cannot show a
+# significant difference. The exit status is 1 if any cell regressed,
+# so this can be used as a gate in CI.
+
+import argparse
+import json
+import math
+import sys
+
+import benchmark
+import matchers
+
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_ALPHA = 0.05
+# More trials make the test more sensitive. With fewer than about 8
+# per side it cannot reach the usual levels of significance.
+DEFAULT_REPEAT = 15
+
+
+def mann_whitney(old, new):
+    """Return the U statistic for new and the one-sided p-value for
+    the hypothesis that values in new tend to be larger than in old.
+
+    Uses the normal approximation with a correction for ties, which
+    is reasonable once each sample has 8 or more values.
+    """
+    n1, n2 = len(old), len(new)
+    if not n1 or not n2:
+        raise ValueError('both samples need values')
+    combined = sorted([(v, 0) for v in old] + [(v, 1) for v in new])
+    # Give tied values the average of the ranks they cover.
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        size = j - i + 1
+        tie_term += size ** 3 - size
+        i = j + 1
+    rank_sum = sum(r for r, (v, side) in zip(ranks, combined) if side == 1)
+    u = rank_sum - n2 * (n2 + 1) / 2
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        # Every value is the same.
+        return (u, 1.0)
+    # Continuity correction, towards the mean.
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    p = 0.5 * math.erfc(z / math.sqrt(2))
+    return (u, p)
+
+
+def _median(times):
+    return benchmark.percentile(times, 50)
+
+
+def compare(old_results, new_results, threshold=DEFAULT_THRESHOLD,
+            alpha=DEFAULT_ALPHA):
+    """Compare two lists of benchmark results cell by cell.
+
+    Returns a list of dicts describing each cell in old_results, with
+    'regressed' set for the ones that got slower, or that have no
+    usable times in new_results.
+    """
+    def key(r):
+        return (r['case'], r['engine'], r['length'])
+
+    new_by_key = {key(r): r for r in new_results}
+    rows = []
+    for old in old_results:
+        row = {'case': old['case'], 'engine': old['engine'],
+               'length': old['length'], 'regressed': False}
+        new = new_by_key.get(key(old))
+        if not old['times']:
+            row['status'] = 'no baseline'
+        elif new is None:
+            # It used to run and now it is skipped.
+            row['status'] = 'missing'
+            row['regressed'] = True
+        elif not new['times']:
+            # It used to work and now it fails.
+            row['status'] = new.get('error', 'no times')
+            row['regressed'] = True
+        elif new.get('over_budget') and not old.get('over_budget'):
+            row['status'] = 'over budget'
+            row['regressed'] = True
+        else:
+            before = _median(old['times'])
+            after = _median(new['times'])
+            u, p = mann_whitney(old['times'], new['times'])
+            change = after / before - 1 if before else 0
+            row.update(old=before, new=after, change=change, p=p)
+            row['regressed'] = change > threshold and p < alpha
+            row['status'] = 'SLOWER' if row['regressed'] else 'ok'
+        rows.append(row)
+    return rows
+
+
+def rerun(old_results, repeat=DEFAULT_REPEAT, budget=math.inf):
+    """Run the cells found in old_results again, and no others.
+
+    By default there is no time budget, so no cell is cut short or
+    skipped because it has become slow. Cells the baseline did not
+    time, such as the longer inputs an engine was too slow for, are
+    not run.
+    """
+    wanted = {}
+    for r in old_results:
+        wanted.setdefault((r['case'], r['engine']), set()).add(r['length'])
+    results = []
+    for case in benchmark.CASES:
+        for engine in matchers.ENGINES:
+            lengths = wanted.get((case.name, engine.name))
+            if not lengths:
+                continue
+            # The results record the length of the text, which is not
+            # always the n used to build it.
+            cell = case._replace(lengths=[
+                n for n in case.lengths if len(case.text(n)) in lengths
+            ])
+            results.extend(benchmark.run([cell], [engine], repeat, budget))
+    return results
+
+
+def _print_rows(rows):
+    print('{:18} {:18} {:>7} {:>10} {:>10} {:>8} {:>8}  {}'.format(
+        'case', 'engine', 'length', 'old ms', 'new ms', 'change', 'p',
+        'status'))
+    for row in rows:
+        if 'change' in row:
+            print('{:18} {:18} {:>7} {:10.3f} {:10.3f} {:+7.1f}% {:8.4f}  {}'
+                  .format(row['case'], row['engine'], row['length'],
+                          row['old'] * 1000, row['new'] * 1000,
+                          row['change'] * 100, row['p'], row['status']))
+        else:
+            print('{:18} {:18} {:>7} {:>10} {:>10} {:>8} {:>8}  {}'.format(
+                row['case'], row['engine'], row['length'], '-', '-', '-',
+                '-', row['status']))
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def _save(path, results, repeat):
+    with open(path, 'w') as f:
+        json.dump({'repeat': repeat, 'results': results}, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare benchmark.py results with a baseline.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    save = sub.add_parser('save', help='run the benchmarks and save them')
+    save.add_argument('baseline')
+    save.add_argument('--case', action='append')
+    save.add_argument('--engine', action='append')
+
+    check = sub.add_parser('check',
+                           help='run the benchmarks and compare')
+    check.add_argument('baseline')
+    check.add_argument('--save', help='also save the new results here')
+
+    diff = sub.add_parser('diff', help='compare two saved runs')
+    diff.add_argument('old')
+    diff.add_argument('new')
+
+    for p in (save, check):
+        p.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    for p in (check, diff):
+        p.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help='fraction the median may grow (default 0.10)')
+        p.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                       help='significance level (default 0.05)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'save':
+        cases = [c for c in benchmark.CASES
+                 if not args.case or c.name in args.case]
+        engines = [e for e in matchers.ENGINES
+                   if not args.engine or e.name in args.engine]
+        results = benchmark.run(cases, engines, args.repeat)
+        _save(args.baseline, results, args.repeat)
+        print('saved {} results to {}'.format(len(results), args.baseline))
+        return 0
+
+    if args.command == 'check':
+        old = _load(args.baseline)
+        new = rerun(old, args.repeat)
+        if args.save:
+            _save(args.save, new, args.repeat)
+    else:
+        old = _load(args.old)
+        new = _load(args.new)
+
+    rows = compare(old, new, args.threshold, args.alpha)
+    _print_rows(rows)
+    regressed = [row for row in rows if row['regressed']]
+    if regressed:
+        print('\n{} of {} cells regressed'.format(len(regressed), len(rows)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
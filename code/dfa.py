@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+# Ahead of time conversion of an NFA, in the numbered form of a
+# program.Program, into a minimized DFA. The result is stored as flat
+# integer tables so it can be saved to disk, loaded again without
+# parsing the pattern, and run without creating any objects per
+# character.
+#
+# Subset construction and Hopcroft's minimization algorithm are
+# described in chapter 3 of "Compilers: Principles, Techniques, and
+# Tools" by Aho, Lam, Sethi, and Ullman.
+
+import array
+import collections
+import json
+import logging
+import sys
+
+import nfa
+import program
+import tracing
+
+# Refuse to build DFAs with more states than this, because the subset
+# construction can produce exponentially many states for some
+# patterns.
+DEFAULT_MAX_STATES = 10000
+
+# Characters that do not appear in the pattern all behave the same
+# way, so they share class 0. The classes are looked up by code point,
+# so bytes-like inputs can use the same tables.
+OTHER = 0
+
+# Increment when the layout written by save() changes.
+FORMAT_VERSION = 1
+
+
+class TooManyStates(ValueError):
+    "Raised when a DFA would need more states than allowed."
+
+
+class DFA:
+    """A DFA stored as transition tables.
+
+    table[state * nclasses + class] gives the next state. accept[state]
+    is 1 for states reached at the end of a match. dead is the state
+    from which nothing can ever match, or -1 if there is none.
+    """
+
+    def __init__(self, classes, table, accept, start, dead,
+                 unanchored=False):
+        self.classes = classes
+        self.nclasses = len(classes) + 1
+        self.table = table
+        self.accept = accept
+        self.start = start
+        self.dead = dead
+        self.unanchored = unanchored
+
+    @property
+    def nstates(self):
+        return len(self.accept)
+
+    def __repr__(self):
+        return 'DFA(states={}, classes={}, unanchored={})'.format(
+            self.nstates, self.nclasses, self.unanchored)
+
+    def match_end(self, s, start):
+        """Return the end of the longest match beginning at start, or
+        -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        tracer = tracing.current.get()
+        classes = self.classes
+        table = self.table
+        accept = self.accept
+        nclasses = self.nclasses
+        dead = self.dead
+        state = self.start
+        last = -1
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            code = s[i] if binary else ord(s[i])
+            state = table[state * nclasses + classes.get(code, OTHER)]
+            if state == dead:
+                break
+            if accept[state]:
+                last = i + 1
+        return last
+
+    def search_end(self, s, start):
+        """Return the end of the first match to finish at or after
+        start, or -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        tracer = tracing.current.get()
+        classes = self.classes
+        table = self.table
+        accept = self.accept
+        nclasses = self.nclasses
+        state = self.start
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            code = s[i] if binary else ord(s[i])
+            state = table[state * nclasses + classes.get(code, OTHER)]
+            if accept[state]:
+                return i + 1
+        return -1
+
+    def save(self, f):
+        "Write the tables to the binary file f."
+        header = {
+            'version': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'itemsize': self.table.itemsize,
+            'classes': self.classes,
+            'start': self.start,
+            'dead': self.dead,
+            'nstates': self.nstates,
+            'unanchored': self.unanchored,
+        }
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        self.table.tofile(f)
+        self.accept.tofile(f)
+
+    @classmethod
+    def load(cls, f):
+        "Read tables written by save() from the binary file f."
+        header = json.loads(f.readline().decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError('unsupported DFA format version {}'.format(
+                header['version']))
+        table = array.array('i')
+        if table.itemsize != header['itemsize']:
+            raise ValueError('DFA tables were saved with {} byte '
+                             'integers'.format(header['itemsize']))
+        # JSON object keys are always strings.
+        classes = {int(k): v for k, v in header['classes'].items()}
+        nstates = header['nstates']
+        table.fromfile(f, nstates * (len(classes) + 1))
+        accept = array.array('b')
+        accept.fromfile(f, nstates)
+        if header['byteorder'] != sys.byteorder:
+            table.byteswap()
+        return cls(classes, table, accept, header['start'],
+                   header['dead'], header['unanchored'])
+
+
+def from_pattern(pattern, unanchored=False,
+                 max_states=DEFAULT_MAX_STATES, reverse=False):
+    """Parse a pattern and build a minimized DFA for it.
+
+    If reverse is true, the DFA matches the same strings read
+    backwards.
+    """
+    return from_program(program.from_pattern(pattern, reverse),
+                        unanchored, max_states)
+
+
+def from_nfa(start, unanchored=False, max_states=DEFAULT_MAX_STATES):
+    "Build a minimized DFA from the output of nfa.post2nfa()."
+    return from_program(program.from_nfa(start), unanchored, max_states)
+
+
+def from_program(prog, unanchored=False, max_states=DEFAULT_MAX_STATES):
+    "Build a minimized DFA from a program.Program."
+    # Number the characters used in the pattern. Everything else falls
+    # into the OTHER class.
+    classes = {}
+    for pc in range(len(prog)):
+        if prog.op[pc] == program.CHAR:
+            code = prog.char[pc]
+            if code not in classes:
+                classes[code] = len(classes) + 1
+    nclasses = len(classes) + 1
+
+    table, accept, start_index = _subsets(
+        prog, classes, nclasses, unanchored, max_states)
+    logging.debug('subset construction made %d states', len(accept))
+    table, accept, start_index, dead = _minimize(
+        table, accept, nclasses, start_index)
+    logging.debug('minimized to %d states', len(accept))
+    return DFA(classes, table, accept, start_index, dead, unanchored)
+
+
+def _subsets(prog, classes, nclasses, unanchored, max_states):
+    "Run the subset construction, returning lists of states."
+    op = prog.op
+    char = prog.char
+    out1 = prog.out1
+    start_states = prog.closure([prog.start])
+
+    # Map each set of NFA states to its DFA state number. When running
+    # unanchored the DFA states remember only what was reached by
+    # consuming input, and the NFA start states are added back before
+    # the next character, as in lazydfa.LazyDFA.
+    first = frozenset() if unanchored else start_states
+    numbers = {first: 0}
+    sets = [first]
+    table = []
+    accept = []
+
+    i = 0
+    while i < len(sets):
+        current = sets[i]
+        accept.append(int(any(op[pc] == program.MATCH for pc in current)))
+        if unanchored:
+            current = current | start_states
+        row = [0] * nclasses
+        for code, cls in classes.items():
+            following = prog.closure(
+                out1[pc]
+                for pc in current
+                if op[pc] == program.CHAR and char[pc] == code
+            )
+            row[cls] = _number(following, numbers, sets, max_states)
+        # Characters outside the pattern can only restart the search.
+        row[OTHER] = _number(frozenset(), numbers, sets, max_states)
+        table.extend(row)
+        i += 1
+
+    return table, accept, 0
+
+
+def _number(states, numbers, sets, max_states):
+    try:
+        return numbers[states]
+    except KeyError:
+        pass
+    if len(sets) >= max_states:
+        raise TooManyStates(
+            'DFA needs more than {} states'.format(max_states))
+    n = numbers[states] = len(sets)
+    sets.append(states)
+    return n
+
+
+def _minimize(table, accept, nclasses, start):
+    """Merge equivalent states with Hopcroft's algorithm and return
+    compact tables for the result."""
+    nstates = len(accept)
+
+    # inverse[c][t] lists the states that go to t on class c.
+    inverse = [[[] for _ in range(nstates)] for _ in range(nclasses)]
+    for s in range(nstates):
+        for c in range(nclasses):
+            inverse[c][table[s * nclasses + c]].append(s)
+
+    # Start by separating the accepting states from the others.
+    blocks = []
+    block_of = [0] * nstates
+    for flag in (1, 0):
+        members = {s for s in range(nstates) if accept[s] == flag}
+        if members:
+            for s in members:
+                block_of[s] = len(blocks)
+            blocks.append(members)
+    waiting = set(range(len(blocks)))
+
+    while waiting:
+        splitter = blocks[waiting.pop()]
+        for c in range(nclasses):
+            # The states with a transition into the splitter.
+            leading = set()
+            for t in splitter:
+                leading.update(inverse[c][t])
+            touched = collections.defaultdict(set)
+            for s in leading:
+                touched[block_of[s]].add(s)
+            for b, inside in touched.items():
+                if len(inside) == len(blocks[b]):
+                    continue
+                # Split the block into the states that lead into the
+                # splitter and the ones that do not.
+                outside = blocks[b] - inside
+                blocks[b] = inside
+                new = len(blocks)
+                blocks.append(outside)
+                for s in outside:
+                    block_of[s] = new
+                if b in waiting:
+                    waiting.add(new)
+                elif len(inside) <= len(outside):
+                    waiting.add(b)
+                else:
+                    waiting.add(new)
+
+    # Renumber the blocks in the order they are reached from the start
+    # so the result does not depend on how the blocks were split.
+    order = {block_of[start]: 0}
+    todo = [block_of[start]]
+    new_table = array.array('i')
+    new_accept = array.array('b')
+    while todo:
+        b = todo.pop(0)
+        s = next(iter(blocks[b]))
+        new_accept.append(accept[s])
+        for c in range(nclasses):
+            t = block_of[table[s * nclasses + c]]
+            if t not in order:
+                order[t] = len(order)
+                todo.append(t)
+            new_table.append(order[t])
+
+    dead = -1
+    for s in range(len(new_accept)):
+        row = new_table[s * nclasses:(s + 1) * nclasses]
+        if not new_accept[s] and all(t == s for t in row):
+            dead = s
+            break
+
+    return new_table, new_accept, 0, dead
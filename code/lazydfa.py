@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+# A DFA built lazily from an NFA, based on the approach described in
+# https://swtch.com/~rsc/regexp/regexp1.html under "Caching the NFA
+# to Build a DFA". Each DFA state stands for a set of NFA states, and
+# the transition out of it for a given character is only computed the
+# first time that character is seen in that state.
+#
+# The NFA states are the numbered states of a program.Program.
+
+import logging
+
+import nfa
+import program
+import tracing
+
+# The default limit on the number of DFA states kept in the cache. The
+# states hold sets of NFA states and a table of transitions, so the
+# count is used as a stand-in for how much memory the cache uses.
+DEFAULT_MAX_STATES = 1000
+
+
+class DState:
+    "One state in the DFA, standing for a set of NFA states."
+
+    def __init__(self, states, tags):
+        self.states = states
+        # Transitions we have computed so far, indexed by the code
+        # point of the character.
+        self.next = {}
+        # The tags of the NFA match states in the set. There is more
+        # than one when several patterns are combined (see
+        # patternset.py).
+        self.tags = tags
+        # We only ever check for a match after consuming a character,
+        # so a DFA state is a match if any of its NFA states is.
+        self.is_match = bool(tags)
+
+    def __repr__(self):
+        return 'DState({}, match={})'.format(
+            sorted(self.states), self.is_match)
+
+
+class LazyDFA:
+    """Run a Program as a DFA, building the DFA states as they are
+    needed.
+
+    When unanchored is true, the NFA start state is added back in
+    before every character so a match may begin anywhere.
+    """
+
+    def __init__(self, prog, unanchored=False,
+                 max_states=DEFAULT_MAX_STATES):
+        self.prog = prog
+        self.unanchored = unanchored
+        self.max_states = max_states
+        self.start_states = prog.closure([prog.start])
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        if unanchored:
+            # Nothing has been consumed yet. The start states are
+            # added on every step.
+            self.start = self._dstate(frozenset())
+        else:
+            self.start = self._dstate(self.start_states)
+
+    def _dstate(self, states):
+        "Return the cached DFA state for a set of NFA states."
+        try:
+            return self.cache[states]
+        except KeyError:
+            pass
+        op = self.prog.op
+        char = self.prog.char
+        d = DState(states, frozenset(
+            char[pc] for pc in states if op[pc] == program.MATCH
+        ))
+        self.cache[states] = d
+        return d
+
+    def flush(self, keep):
+        """Drop every cached state except keep, so the DFA is rebuilt
+        as the input is processed."""
+        logging.debug('flushing %d DFA states', len(self.cache))
+        self.flushes += 1
+        # Clear the transitions too, otherwise the old states stay
+        # reachable through them and the memory is never released.
+        for d in self.cache.values():
+            d.next.clear()
+        self.cache.clear()
+        self.cache[keep.states] = keep
+        if self.start is not keep:
+            self.start.next.clear()
+            self.cache[self.start.states] = self.start
+
+    def step(self, d, code):
+        """Return the DFA state reached from d by consuming the
+        character with the given code point."""
+        try:
+            n = d.next[code]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return n
+
+        self.misses += 1
+        if len(self.cache) >= self.max_states:
+            self.flush(d)
+
+        current = d.states
+        if self.unanchored:
+            current = current | self.start_states
+        op = self.prog.op
+        char = self.prog.char
+        out1 = self.prog.out1
+        n = self._dstate(self.prog.closure(
+            out1[pc]
+            for pc in current
+            if op[pc] == program.CHAR and char[pc] == code
+        ))
+        d.next[code] = n
+        return n
+
+    def match_end(self, s, start):
+        """Return the end of the longest match beginning at start, or
+        -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        hits, misses = self.hits, self.misses
+        tracer = tracing.current.get()
+        d = self.start
+        last = -1
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            d = self.step(d, s[i] if binary else ord(s[i]))
+            if not d.states:
+                # Nothing can match from here on.
+                break
+            if d.is_match:
+                last = i + 1
+        self._report(hits, misses)
+        return last
+
+    def search_end(self, s, start):
+        """Return the end of the first match to finish at or after
+        start, or -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        hits, misses = self.hits, self.misses
+        tracer = tracing.current.get()
+        d = self.start
+        end = -1
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            d = self.step(d, s[i] if binary else ord(s[i]))
+            if d.is_match:
+                end = i + 1
+                break
+        self._report(hits, misses)
+        return end
+
+    def match_start(self, s, end, stop=0):
+        """Scan backwards from end, for a DFA built from the reversed
+        pattern, and return the start of the longest match ending at
+        end that does not begin before stop, or -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        hits, misses = self.hits, self.misses
+        tracer = tracing.current.get()
+        d = self.start
+        first = -1
+        for i in range(end - 1, stop - 1, -1):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            d = self.step(d, s[i] if binary else ord(s[i]))
+            if not d.states:
+                break
+            if d.is_match:
+                first = i
+        self._report(hits, misses)
+        return first
+
+    def _report(self, hits, misses):
+        # The cache counters are compared once per call, instead of
+        # being sent with every dfa.step event.
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('dfa.run', dfa=self, hits=self.hits - hits,
+                   misses=self.misses - misses)
+
+
+class LeftmostDFA(LazyDFA):
+    """Find where the leftmost longest match ends in a single pass.
+
+    An unanchored DFA forgets where each match began, so it can only
+    tell where the first match to finish ends. Here each DFA state
+    stands for a list of sets of NFA states instead, one set for each
+    position a match may have begun at, in order. A state reached
+    from an earlier start is left out of the later sets, the same way
+    the Pike VM skips threads that are already on its list. Once a set
+    reaches the match state, no new starts are added and the sets for
+    later starts are dropped, so the scan ends with the leftmost match
+    and stops as soon as it cannot get any longer.
+
+    The key of each state is (sets, restarting), where restarting is
+    true until a match has been seen.
+    """
+
+    def __init__(self, prog, max_states=DEFAULT_MAX_STATES):
+        self.prog = prog
+        self.unanchored = True
+        self.max_states = max_states
+        self.start_states = prog.closure([prog.start])
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.start = self._dstate(((), True))
+
+    def _dstate(self, key):
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        op = self.prog.op
+        char = self.prog.char
+        sets, restarting = key
+        d = DState(key, frozenset(
+            char[pc] for states in sets for pc in states
+            if op[pc] == program.MATCH
+        ))
+        self.cache[key] = d
+        return d
+
+    def step(self, d, code):
+        try:
+            n = d.next[code]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return n
+
+        self.misses += 1
+        if len(self.cache) >= self.max_states:
+            self.flush(d)
+
+        sets, restarting = d.states
+        if restarting:
+            # A match may also begin here, after all the others.
+            sets = sets + (self.start_states,)
+        op = self.prog.op
+        char = self.prog.char
+        out1 = self.prog.out1
+        seen = frozenset()
+        following = []
+        for states in sets:
+            reached = self.prog.closure(
+                out1[pc]
+                for pc in states
+                if op[pc] == program.CHAR and char[pc] == code
+            ) - seen
+            if not reached:
+                continue
+            seen = seen | reached
+            following.append(reached)
+            if any(op[pc] == program.MATCH for pc in reached):
+                restarting = False
+                break
+        n = self._dstate((tuple(following), restarting))
+        d.next[code] = n
+        return n
+
+    def leftmost_end(self, s, start):
+        """Return the end of the leftmost longest match beginning at or
+        after start, or -1 if there is none."""
+        s, binary = nfa.prepare_input(s)
+        hits, misses = self.hits, self.misses
+        tracer = tracing.current.get()
+        d = self.start
+        last = -1
+        for i in range(start, len(s)):
+            if tracer is not None:
+                tracer('dfa.step', i=i)
+            d = self.step(d, s[i] if binary else ord(s[i]))
+            if d.is_match:
+                last = i + 1
+            sets, restarting = d.states
+            if not sets and not restarting:
+                # Nothing can make the match any longer.
+                break
+        self._report(hits, misses)
+        return last
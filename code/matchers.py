@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# The matchers in this directory, by name, with the syntax each one
+# understands. Shared by benchmark.py, which times them, and
+# analyze.py, which recommends one for a pattern.
+
+import collections
+import contextlib
+import io
+
+import nfa
+import pike
+import recursive_descent
+
+
+# factory(pattern) returns a function that searches one input. syntax
+# is the set of special characters the engine understands, and
+# accepts(pattern) can reject other patterns it cannot run.
+Engine = collections.namedtuple('Engine', ['name', 'factory', 'syntax',
+                                           'accepts'])
+
+
+def _nfa(engine, dedupe=False):
+    def factory(pattern):
+        return nfa.compile(pattern, dedupe=dedupe, engine=engine).search
+    return factory
+
+
+def _pike(fn):
+    def factory(pattern):
+        def search(text):
+            # pike.match() prints every step.
+            with contextlib.redirect_stdout(io.StringIO()):
+                return fn(pattern, text)
+        return search
+    return factory
+
+
+def _nullable(node):
+    "Return True if a recursive_descent node can match nothing."
+    if isinstance(node, (recursive_descent.Blank,
+                         recursive_descent.Repetition)):
+        return True
+    if isinstance(node, recursive_descent.Choice):
+        return _nullable(node.a) or _nullable(node.b)
+    if isinstance(node, recursive_descent.Concatenate):
+        return _nullable(node.first) and _nullable(node.second)
+    return False
+
+
+def _rd_terminates(pattern):
+    """Return False if the pattern repeats something that can match
+    nothing, which makes the recursive descent matcher loop forever."""
+    todo = [recursive_descent.parse_iterative(pattern)]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, recursive_descent.Repetition):
+            if _nullable(node.internal):
+                return False
+            todo.append(node.internal)
+        elif isinstance(node, recursive_descent.Choice):
+            todo.extend([node.a, node.b])
+        elif isinstance(node, recursive_descent.Concatenate):
+            todo.extend([node.first, node.second])
+    return True
+
+
+def _always(pattern):
+    return True
+
+
+NFA_SYNTAX = set('()|*+?')
+PIKE_SYNTAX = set('.*^$')
+RD_SYNTAX = set('()|*')
+
+ENGINES = [
+    Engine('nfa', _nfa('nfa'), NFA_SYNTAX, _always),
+    Engine('nfa-dedupe', _nfa('nfa', dedupe=True), NFA_SYNTAX, _always),
+    Engine('pikevm', _nfa('pikevm'), NFA_SYNTAX, _always),
+    Engine('dfa', _nfa('dfa'), NFA_SYNTAX, _always),
+    Engine('bitparallel', _nfa('bitparallel'), NFA_SYNTAX, _always),
+    Engine('pike', _pike(pike.match), PIKE_SYNTAX, _always),
+    Engine('pike-iterative', _pike(pike.match_iterative), PIKE_SYNTAX,
+           _always),
+    Engine('recursive_descent',
+           lambda pattern: recursive_descent.parse(pattern).match,
+           RD_SYNTAX, _rd_terminates),
+    Engine('rd-memo',
+           lambda pattern: recursive_descent.parse(pattern).memo_match,
+           RD_SYNTAX, _rd_terminates),
+    Engine('rd-compiled',
+           lambda pattern: recursive_descent.compile(pattern).match,
+           RD_SYNTAX, _always),
+    Engine('rd-backtracker',
+           lambda pattern: recursive_descent.Backtracker(
+               recursive_descent.parse_iterative(pattern)).match,
+           RD_SYNTAX, _always),
+]
+
+
+def supports(engine, pattern):
+    "Return True if the engine can run the pattern."
+    special = NFA_SYNTAX | PIKE_SYNTAX
+    used = {c for c in pattern if c in special}
+    return used <= engine.syntax and engine.accepts(pattern)
+
+
+def by_name(name):
+    "Return the Engine called name."
+    for engine in ENGINES:
+        if engine.name == name:
+            return engine
+    raise ValueError('unknown engine {!r}'.format(name))
@@ -9,6 +9,8 @@ import collections
 import itertools
 import logging
 
+import tracing
+
 GROUP_START = '('
 GROUP_END = ')'
 LITERAL = 'lit'
@@ -189,6 +191,32 @@ def postfix(tokens):
     return post
 
 
+def reverse_postfix(tokens):
+    """Return postfix tokens for the pattern that matches the same
+    strings backwards."""
+    # Evaluate the tokens with a stack of the postfix for each
+    # subexpression, swapping the two sides of every concatenation.
+    stack = []
+    for t in tokens:
+        if t.op == LITERAL:
+            stack.append([t])
+        elif t.op == CONCAT:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(b + a + [t])
+        elif t.op == ALTERNATE:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(a + b + [t])
+        elif t.op in UOPS:
+            stack.append(stack.pop() + [t])
+        else:
+            raise ValueError('Unhandled token {}'.format(t))
+    if len(stack) != 1:
+        raise ValueError(stack)
+    return stack[0]
+
+
 def post2nfa(tokens):
     "Turn the postfix order token set into an NFA."
 
@@ -338,20 +366,27 @@ class State:
         # outgoing links from any state.
         self.out1 = out1
         self.out2 = out2
+        # The id of the last list of paths this state was added to,
+        # used by next_paths() to avoid duplicates. Because the marker
+        # lives on the state, one NFA should not be used by several
+        # threads at once when deduplicating.
+        self.lastlist = None
         logging.debug('new %s', self)
 
     def set_out1(self, state):
-        logging.debug('set_out1({}, {})'.format(self.n, state.n))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('nfa.set_out', state=self, which=1, target=state)
         if self.out1 != None:
-            logging.warning('WARNING: resetting from {}'.format(
-                self.out1.n))
+            logging.warning('WARNING: resetting from %s', self.out1.n)
         self.out1 = state
 
     def set_out2(self, state):
-        logging.debug('set_out2({}, {})'.format(self.n, state.n))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('nfa.set_out', state=self, which=2, target=state)
         if self.out2 != None:
-            logging.warning('WARNING: resetting from {}'.format(
-                self.out.n))
+            logging.warning('WARNING: resetting from %s', self.out2.n)
         self.out2 = state
 
     def __repr__(self):
@@ -387,42 +422,370 @@ class Frag:
             os(start)
 
 
-def match(pattern, s):
-    "Parse a pattern and match it against the input text s."
-    logging.debug('pattern: %s', pattern)
+# Compiled patterns are kept in a bounded cache so that calling
+# match() over and over with the same expression does not tokenize,
+# reorder, and rebuild the NFA every time.
+DEFAULT_CACHE_SIZE = 128
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class PatternCache:
+    "A least-recently-used cache of compiled patterns."
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # The OrderedDict remembers the order in which keys were used,
+        # with the most recently used pattern at the end.
+        self._patterns = collections.OrderedDict()
+
+    def get(self, key, factory):
+        "Return the cached value for key, building it if needed."
+        try:
+            value = self._patterns[key]
+        except KeyError:
+            self.misses += 1
+            value = factory()
+            if self.maxsize > 0:
+                self._patterns[key] = value
+                self._evict()
+        else:
+            self.hits += 1
+            self._patterns.move_to_end(key)
+        return value
+
+    def resize(self, maxsize):
+        "Change the maximum number of patterns held."
+        if maxsize < 0:
+            raise ValueError('cache size must not be negative')
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        "Drop all cached patterns and reset the counters."
+        self._patterns.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._patterns))
 
-    tokens = list(tokenize(pattern))
-    logging.debug('tokens %s', tokens)
+    def _evict(self):
+        # Throw away the least recently used patterns until we fit.
+        while len(self._patterns) > self.maxsize:
+            self._patterns.popitem(last=False)
 
-    pf = postfix(tokens)
 
-    logging.debug('postfix: %s', pf)
+_cache = PatternCache()
 
-    nfa, all_states = post2nfa(pf)
-    logging.debug('\nnfa starting with: %s', nfa)
-    logging.debug('all_states %s', all_states)
 
-    for start in range(len(s)):
-        m = _match(nfa, s, start)
-        if m:
+def cache_info():
+    "Report hits, misses, and size of the compiled pattern cache."
+    return _cache.info()
+
+
+def set_cache_size(maxsize):
+    "Change how many compiled patterns are remembered."
+    _cache.resize(maxsize)
+
+
+def purge():
+    "Clear the compiled pattern cache."
+    _cache.clear()
+
+
+# The ways a compiled Pattern can do its matching. "nfa" steps
+# through Path objects for every character. "pikevm" runs threads
+# that carry capture slots instead of their history (see pikevm.py).
+# "dfa" uses a lazily built DFA (see lazydfa.py) and only falls back
+# to the Pike VM when the group text and extents are needed.
+# "bitparallel" does the same with the bit-parallel Glushkov automaton
+# from bitparallel.py. "auto" picks "bitparallel" for patterns small
+# enough to fit in a machine word and "dfa" for the rest.
+ENGINES = ('nfa', 'pikevm', 'dfa', 'bitparallel', 'auto')
+
+
+def compile(pattern, dedupe=False, engine='nfa'):
+    "Return a compiled Pattern, reusing a cached one when possible."
+    return _cache.get(
+        (pattern, dedupe, engine),
+        lambda: Pattern(pattern, dedupe, engine),
+    )
+
+
+class Pattern:
+    "A compiled regular expression that can be applied many times."
+
+    def __init__(self, pattern, dedupe=False, engine='nfa'):
+        logging.debug('pattern: %s', pattern)
+        if engine not in ENGINES:
+            raise ValueError('unknown engine {!r}'.format(engine))
+        self.pattern = pattern
+        # When dedupe is set the simulation keeps at most one path per
+        # NFA state at each step (see next_paths()).
+        self.dedupe = dedupe
+
+        tokens = list(tokenize(pattern))
+        logging.debug('tokens %s', tokens)
+
+        self.postfix = postfix(tokens)
+        logging.debug('postfix: %s', self.postfix)
+
+        self.nfa, self.all_states = post2nfa(self.postfix)
+        logging.debug('\nnfa starting with: %s', self.nfa)
+        logging.debug('all_states %s', self.all_states)
+
+        # Literal text every match must contain lets search() skip
+        # ahead with str.find().
+        import prefilter
+        self.prefilter = prefilter.Prefilter.from_postfix(self.postfix)
+        logging.debug('prefilter: %s', self.prefilter)
+
+        # The other engines run on the numbered form of the NFA. They
+        # are imported here because they need this module.
+        import program
+        self.program = program.from_nfa(self.nfa)
+
+        glushkov = None
+        if engine in ('bitparallel', 'auto'):
+            import bitparallel
+            glushkov = bitparallel.from_postfix(self.postfix)
+            if engine == 'auto':
+                engine = 'bitparallel' if bitparallel.fits(glushkov) \
+                    else 'dfa'
+        self.engine = engine
+
+        self.vm = None
+        if engine in ('pikevm', 'dfa', 'bitparallel'):
+            import pikevm
+            self.vm = pikevm.PikeVM(self.program)
+
+        # Anything with match_end() and search_end() methods can be
+        # used to find where the match is before the groups are
+        # worked out.
+        self.anchored_dfa = self.search_dfa = None
+        if engine == 'dfa':
+            import lazydfa
+            self.anchored_dfa = lazydfa.LazyDFA(self.program)
+            self.search_dfa = lazydfa.LazyDFA(self.program, unanchored=True)
+        elif engine == 'bitparallel':
+            self.anchored_dfa = self.search_dfa = bitparallel.BitParallel(
+                glushkov)
+
+        # Once the DFA above finds that there is a match, these find
+        # where the leftmost one ends and then, scanning backwards
+        # with the reversed pattern, where it starts.
+        self.leftmost_dfa = self.reverse_dfa = None
+        if self.search_dfa is not None:
+            import lazydfa
+            self.leftmost_dfa = lazydfa.LeftmostDFA(self.program)
+            self.reverse_dfa = lazydfa.LazyDFA(program.from_nfa(
+                post2nfa(reverse_postfix(self.postfix))[0]))
+
+    def __repr__(self):
+        return 'Pattern({!r})'.format(self.pattern)
+
+    def match(self, s, captures=True):
+        """Match the pattern only at the beginning of s.
+
+        If captures is false, the result may only describe group 0.
+        """
+        s = prepare_input(s)[0]
+        if self.prefilter is not None and \
+           not self.prefilter.can_start(s, 0):
+            return None
+        if self.anchored_dfa is not None:
+            end = self.anchored_dfa.match_end(s, 0)
+            if end < 0:
+                return None
+            if not captures:
+                return Match.from_span(s, 0, end)
+        if self.vm is not None:
+            return self.vm.match(s)
+        return _match(self.nfa, s, 0, self.dedupe)
+
+    def search(self, s, captures=True, pos=0):
+        """Find the leftmost (and then longest) match in s at or after
+        pos.
+
+        If captures is false, the result may only describe group 0.
+        """
+        s = prepare_input(s)[0]
+        prefilter = self.prefilter
+        if prefilter is not None and prefilter.rejects(s, pos):
+            return None
+        if self.search_dfa is not None:
+            span = self._dfa_span(s, pos)
+            if span is None:
+                return None
+            if not captures:
+                return Match.from_span(s, *span)
+            # The leftmost match cannot start before the span found
+            # by the DFA, so skip ahead.
+            return self.vm.search(s, span[0])
+        if self.vm is not None:
+            return self.vm.search(s, pos, prefilter)
+        return _search(self.nfa, s, self.dedupe, prefilter, pos)
+
+    def fullmatch(self, s, captures=True):
+        """Match the pattern against all of s.
+
+        If captures is false, the result may only describe group 0.
+        """
+        m = self.match(s, captures)
+        # The longest match is chosen, so if any path consumes the
+        # whole input that is the one we get back.
+        if m and m.extents[0][1] == len(s):
             return m
-    return None
+        return None
+
+    def finditer(self, s, captures=True):
+        """Yield the matches in s from left to right.
+
+        The matches do not overlap. Each search resumes where the
+        previous match ended, and matches are produced one at a time
+        so they are never all held in memory.
+        """
+        s = prepare_input(s)[0]
+        pos = 0
+        while True:
+            m = self.search(s, captures, pos)
+            if m is None:
+                return
+            yield m
+            # Matches always consume at least one character, so this
+            # makes progress.
+            pos = m.extents[0][1]
+
+    def findall(self, s):
+        "Return a list of the text of every match in s."
+        return [m.text[0] for m in self.finditer(s, captures=False)]
+
+    def split(self, s, maxsplit=0):
+        """Return a list of the pieces of s between the matches.
+
+        If maxsplit is more than 0, at most that many splits are done
+        and the rest of s is the last piece.
+        """
+        s = prepare_input(s)[0]
+        pieces = []
+        last = 0
+        for m in self.finditer(s, captures=False):
+            start, end = m.extents[0]
+            pieces.append(_slice(s, last, start))
+            last = end
+            if len(pieces) == maxsplit:
+                break
+        pieces.append(_slice(s, last, len(s)))
+        return pieces
+
+    def sub(self, repl, s, count=0):
+        """Return s with the matches replaced by repl.
+
+        repl is either the replacement text or a function that is
+        called with each Match and returns its replacement. If count
+        is more than 0, at most that many matches are replaced.
+        """
+        s = prepare_input(s)[0]
+        # Functions may look at the groups, plain text never does.
+        captures = callable(repl)
+        pieces = []
+        last = 0
+        for n, m in enumerate(self.finditer(s, captures), 1):
+            start, end = m.extents[0]
+            pieces.append(_slice(s, last, start))
+            pieces.append(repl(m) if captures else repl)
+            last = end
+            if n == count:
+                break
+        pieces.append(_slice(s, last, len(s)))
+        return ('' if isinstance(s, str) else b'').join(pieces)
+
+    def _dfa_span(self, s, pos=0):
+        "Use the DFAs to find the start and end of the leftmost match."
+        start = self._next_start(s, pos)
+        if start < 0:
+            return None
+        # One quick pass with the unanchored DFA tells us whether
+        # there is a match at all.
+        if self.search_dfa.search_end(s, start) < 0:
+            return None
+        # Trying the anchored DFA at every position up to there would
+        # take time proportional to the square of the distance, so
+        # instead find the end of the leftmost match in one pass, and
+        # the longest match ending there by scanning back to start.
+        end = self.leftmost_dfa.leftmost_end(s, start)
+        begin = self.reverse_dfa.match_start(s, end, start) \
+            if end >= 0 else -1
+        if begin < 0:
+            raise RuntimeError('DFA found a match but no start for it')
+        return (begin, end)
+
+    def _next_start(self, s, i):
+        if self.prefilter is None:
+            return i
+        return self.prefilter.next_start(s, i)
+
+
+def _slice(s, start, end):
+    "Return part of the input as str or bytes."
+    text = s[start:end]
+    if not isinstance(text, (str, bytes)):
+        # Slices of memoryviews refer back to the input.
+        text = bytes(text)
+    return text
+
+
+def prepare_input(s):
+    """Check the type of the input to match against.
+
+    Returns the input and a flag that is true when it is a bytes-like
+    object such as bytes, bytearray, memoryview, or mmap.mmap. Those
+    are indexed directly, giving the integer value of each byte, so
+    they are never copied or decoded. Byte values are compared with
+    the code points of the characters in the pattern, and group text
+    is returned as bytes.
+    """
+    if isinstance(s, str):
+        return (s, False)
+    if isinstance(s, memoryview) and s.format != 'B':
+        # Look at the same memory as unsigned bytes.
+        s = s.cast('B')
+    return (s, True)
+
+
+def match(pattern, s):
+    "Parse a pattern and match it against the input text s."
+    return compile(pattern).search(s)
 
 
-def _match(nfa, s, start):
+def _match(nfa, s, start, dedupe=False):
     "Apply an NFA to s beginning with the start position."
-    logging.debug('\nmatch checking {!r}'.format(s))
-    paths = next_paths(Path(nfa, None))
+    s, binary = prepare_input(s)
+    tracer = tracing.current.get()
+    if tracer is not None:
+        tracer('nfa.match', s=s, start=start)
+    paths = next_paths(Path(nfa, None, start), _new_listid(dedupe))
     i = start
 
     ever_matched = []
 
     while i < len(s):
         c = s[i]
-        logging.debug('\nmatch i={} c={}'.format(i, c))
-        paths = step(paths, c, i)
+        if binary:
+            # The states hold characters, and the single character
+            # strings for byte values are cached by Python.
+            c = chr(c)
+        if tracer is not None:
+            tracer('nfa.char', i=i, c=c)
+        paths = step(paths, c, i, _new_listid(dedupe))
         if not paths:
-            logging.debug('no more paths')
+            if tracer is not None:
+                tracer('nfa.no_paths')
             break
 
         # Look for a match token in the upcoming states to tell if we
@@ -430,67 +793,166 @@ def _match(nfa, s, start):
         # because we want to be greedy with matching the text.
         for path in paths:
             if MATCH == path.state.token.op:
-                logging.debug('found match state at %s', i)
+                if tracer is not None:
+                    tracer('nfa.found', i=i, path=path)
                 ever_matched.append(path)
 
         i += 1
 
     if ever_matched:
-        logging.debug('\nfound {} paths'.format(len(ever_matched)))
-        for m in ever_matched:
-            logging.debug('  %s %s %s', m.length(), m, m.matches())
-        with_lengths = sorted(
-            (m.length(), m)
-            for m in ever_matched
-        )
-        return Match(s, with_lengths[-1][1])
+        if tracer is not None:
+            tracer('nfa.matched', paths=ever_matched)
+        return Match(s, _longest(ever_matched))
     return None
 
 
-def next_paths(path):
-    "Compute the next paths from an existing paths' state."
-    logging.debug(
-        'next_paths %s %s',
-        path.state,
-        path.prev.as_chain() if path.prev else None,
-    )
+def _longest(paths):
+    """Pick the longest matching path. When several paths tie, the
+    first one found wins, which gives priority to the out1 link of
+    each split state and keeps the group results deterministic."""
+    return max(paths, key=lambda m: m.length())
+
+
+# Each list of paths built while deduplicating gets a new generation
+# number. States remember the last generation that reached them, so
+# checking whether a state is already on the list being built is a
+# single comparison and the list never has to be cleared.
+_listids = itertools.count(1)
+
+
+def _new_listid(dedupe):
+    return next(_listids) if dedupe else None
+
+
+def _search(nfa, s, dedupe=False, prefilter=None, pos=0):
+    """Apply an NFA to s, trying every start position from pos onward
+    in a single pass over the input.
+
+    If a prefilter.Prefilter is given, paths are only started where
+    the required prefix appears.
+    """
+    s, binary = prepare_input(s)
+    tracer = tracing.current.get()
+    if tracer is not None:
+        tracer('nfa.search', s=s)
+    paths = []
+    ever_matched = []
+    listid = _new_listid(dedupe)
+
+    # The start position of the leftmost match found so far. Once we
+    # have one, there is no point in following paths that began later.
+    leftmost = None
+
+    i = pos
+    while i < len(s):
+        # Until something matches, add a fresh path beginning at this
+        # position to the ones that are already running. That gives
+        # the same results as calling _match() once for every start
+        # position without having to re-read the input each time.
+        #
+        # The new path goes after the existing ones and shares their
+        # list id, so when deduplicating a state already reached by a
+        # path with an earlier start is not added again.
+        if leftmost is None:
+            if prefilter is not None and not paths:
+                # Nothing is running, so jump ahead to the next place
+                # a match could begin.
+                i = prefilter.next_start(s, i)
+                if i < 0:
+                    break
+            if prefilter is None or prefilter.can_start(s, i):
+                paths.extend(next_paths(Path(nfa, None, i), listid))
+
+        c = s[i]
+        if binary:
+            c = chr(c)
+        if tracer is not None:
+            tracer('nfa.char', i=i, c=c)
+        listid = _new_listid(dedupe)
+        paths = step(paths, c, i, listid)
+
+        for path in paths:
+            if MATCH == path.state.token.op:
+                if tracer is not None:
+                    tracer('nfa.found', i=i, path=path)
+                ever_matched.append(path)
+                if leftmost is None or path.start < leftmost:
+                    leftmost = path.start
+
+        if leftmost is not None:
+            # Paths that started to the right of a match can never
+            # produce the leftmost result.
+            paths = [p for p in paths if p.start <= leftmost]
+            if not paths:
+                if tracer is not None:
+                    tracer('nfa.no_paths')
+                break
+
+        i += 1
+
+    if ever_matched:
+        if tracer is not None:
+            tracer('nfa.matched', paths=ever_matched)
+        # Prefer the leftmost start and then the longest text. When
+        # several paths tie, keep the first one we found.
+        return Match(s, _longest(
+            m for m in ever_matched if m.start == leftmost
+        ))
+    return None
+
+
+def next_paths(path, listid=None):
+    """Compute the next paths from an existing paths' state.
+
+    If listid is given, a state that has already been added to the
+    list with that id is skipped, so there is at most one path per
+    state. The first path to arrive wins.
+    """
+    tracer = tracing.current.get()
+    if tracer is not None:
+        tracer('nfa.next_paths', path=path)
+    if listid is not None:
+        if path.state.lastlist == listid:
+            return []
+        path.state.lastlist = listid
     out_paths = []
     # Skip states that aren't character matches, but traverse them to
     # find the next state in both directions.
     if path.state.token.op in SPLIT_OPS:
-        out_paths.extend(next_paths(Path(path.state.out1, path)))
-        out_paths.extend(next_paths(Path(path.state.out2, path)))
+        out_paths.extend(next_paths(Path(path.state.out1, path), listid))
+        out_paths.extend(next_paths(Path(path.state.out2, path), listid))
     else:
         out_paths.append(path)
     return out_paths
 
 
-def step(paths, c, i):
+def step(paths, c, i, listid=None):
     """Step through the NFA states based on the input character,
     returning the paths that can be used."""
-    logging.debug(
-        'step %s %c %d',
-        [(p.state.n, p.state.token.text) for p in paths],
-        c,
-        i,
-    )
+    tracer = tracing.current.get()
+    if tracer is not None:
+        tracer('nfa.step', paths=paths, c=c, i=i)
     out_paths = []
     for path in paths:
         state = path.state
         if state.token.text == c:
-            logging.debug('stepping %s %s', state.n, state.token.groups)
+            if tracer is not None:
+                tracer('nfa.consume', state=state)
             path.c = c
             path.i = i
-            out_paths.extend(next_paths(Path(state.out1, path)))
+            out_paths.extend(next_paths(Path(state.out1, path), listid))
     return out_paths
 
 
 class Path:
     "A remembered traversal of the NFA."
 
-    def __init__(self, state, prev):
+    def __init__(self, state, prev, start=None):
         self.state = state
         self.prev = prev
+        # Remember where in the input the traversal began so that
+        # paths started at different positions can share one pass.
+        self.start = prev.start if prev is not None else start
         self.c = None
         self.i = -1
 
@@ -533,28 +995,35 @@ class Path:
 class Match:
     "Result of matching successfully."
 
-    def __init__(self, s, path):
+    # The stats.Stats for the call that found this match, when it was
+    # run with stats.run().
+    stats = None
+
+    def __init__(self, s, path, groups=None):
         self.s = s
         self.path = path
-        self.text, self.extents = self._handle_groups(self.path)
+        if groups is None:
+            groups = self._handle_groups(self.path)
+        self.text, self.extents = groups
+
+    @classmethod
+    def from_span(cls, s, start, end):
+        "Build a Match describing only group 0."
+        return cls(s, None, ({0: _slice(s, start, end)}, {0: (start, end)}))
 
     def __repr__(self):
         return repr(self.text)
 
     def _handle_groups(self, path):
+        tracer = tracing.current.get()
         text = {}
         extents = {}
         for p in path.reverse():
             if p.c is None:
                 # Skip the empty states
                 continue
-            logging.debug(
-                '_handle_groups %s %s %s %s',
-                p.state.n,
-                p.state.token.op,
-                p.c,
-                p.state.token.groups,
-            )
+            if tracer is not None:
+                tracer('nfa.group', path=p)
             for grp in p.state.token.groups:
                 s = text.get(grp, '')
                 s += p.c
@@ -563,8 +1032,9 @@ class Match:
                 # Use -1 to indicate a position we have not yet filled
                 # in.
                 new_start, new_end = extents.get(grp, (-1, -1))
-                logging.debug('  extent {}: {}, {}'.format(
-                    grp, new_start, new_end))
+                if tracer is not None:
+                    tracer('nfa.extent', group=grp, start=new_start,
+                           end=new_end)
                 # Only move the start position if we haven't started
                 # this extent before.
                 if new_start == -1:
@@ -582,9 +1052,18 @@ class Match:
             for k, v in extents.items()
         }
 
+        if not isinstance(self.s, str):
+            text = encode_text(text)
+
         return (text, real_extents)
 
 
+def encode_text(text):
+    """Convert group text built from the characters for byte values
+    back into bytes."""
+    return {k: v.encode('latin-1') for k, v in text.items()}
+
+
 def _check(pattern, text, expected):
     matched = match(pattern, text)
     logging.debug('match returned {} expected {!r}'.format(
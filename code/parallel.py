@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+# Match one pattern against many independent inputs using a pool of
+# worker processes.
+#
+# The State objects built by nfa.post2nfa() cannot be sent to another
+# process, because the fragments refer to them through bound methods.
+# The numbered program.Program holds only arrays and tuples, so it is
+# pickled once and sent to each worker when it starts. The workers run
+# it with a pikevm.PikeVM. Inputs are sent in batches so the cost of
+# passing data between processes is shared by many lines.
+#
+# A single large input is split into chunks instead, and searched with
+# the ahead of time DFAs from dfa.py (see chunked_search()).
+
+import collections
+import concurrent.futures
+import itertools
+import mmap
+import os
+
+import dfa
+import nfa
+import pikevm
+
+DEFAULT_BATCH_SIZE = 1000
+
+# The matcher for the pattern, set in each worker process by
+# _init_worker().
+_worker = None
+
+
+def match_many(pattern, lines, workers=None,
+               batch_size=DEFAULT_BATCH_SIZE, ordered=True):
+    """Search each of the lines for pattern using worker processes.
+
+    When ordered is true, yield an nfa.Match or None for each line, in
+    the same order as the lines. Otherwise yield (index, result) pairs
+    as soon as each batch is finished.
+
+    lines may be any iterable. It is read a batch at a time, and only
+    a few batches per worker are in flight at once, so it does not
+    need to fit in memory.
+    """
+    compiled = nfa.compile(pattern)
+    workers = workers or os.cpu_count() or 1
+    pool = concurrent.futures.ProcessPoolExecutor(
+        workers,
+        initializer=_init_worker,
+        initargs=(compiled.program, compiled.prefilter),
+    )
+    with pool:
+        batches = _batches(lines, batch_size)
+        # Keep every worker busy while one batch is handed back.
+        limit = workers * 2
+        if ordered:
+            yield from _in_order(pool, batches, limit)
+        else:
+            yield from _as_completed(pool, batches, limit)
+
+
+def _batches(lines, batch_size):
+    "Yield (index of first line, list of lines) pairs."
+    it = iter(lines)
+    index = 0
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            return
+        yield (index, batch)
+        index += len(batch)
+
+
+def _in_order(pool, batches, limit):
+    pending = collections.deque()
+    for _, batch in batches:
+        pending.append(pool.submit(_run_batch, batch))
+        if len(pending) >= limit:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def _as_completed(pool, batches, limit):
+    pending = {}
+    for index, batch in batches:
+        pending[pool.submit(_run_batch, batch)] = index
+        if len(pending) >= limit:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield from enumerate(future.result(), pending.pop(future))
+    for future in concurrent.futures.as_completed(pending):
+        yield from enumerate(future.result(), pending[future])
+
+
+class _Matcher:
+    "Search inputs the way nfa.Pattern.search() does with a Pike VM."
+
+    def __init__(self, prog, prefilter):
+        self.vm = pikevm.PikeVM(prog)
+        self.prefilter = prefilter
+
+    def search(self, s):
+        if self.prefilter is not None and self.prefilter.rejects(s):
+            return None
+        return self.vm.search(s, 0, self.prefilter)
+
+
+def _init_worker(prog, prefilter):
+    global _worker
+    _worker = _Matcher(prog, prefilter)
+
+
+def _run_batch(batch):
+    return [_worker.search(s) for s in batch]
+
+
+# Searching one very large input.
+#
+# Each chunk of the input is handed to a worker, which cannot know
+# which DFA state the chunks before it will leave behind. Instead it
+# runs the chunk from every state of the DFA at once, and returns a
+# summary: for each possible starting state, where the first match
+# ends (if one does) and the state reached at the end of the chunk.
+# Joining the summaries in order gives the same answer as running the
+# DFA over the whole input.
+#
+# Runs from different starting states usually reach the same state
+# after a few characters, and from then on they are followed together,
+# so the cost is close to running the DFA once.
+
+def chunked_search_end(pattern, data, workers=None):
+    """Return the end of the first match to finish in data, or -1 if
+    there is none, scanning chunks of data in parallel."""
+    d = dfa.from_pattern(pattern, unanchored=True)
+    data = nfa.prepare_input(data)[0]
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_summarize, d, _chunk(data, lo, hi), 0,
+                        hi - lo, lo)
+            for lo, hi in _bounds(len(data), workers)
+        ]
+        return _join(d, (f.result() for f in futures))
+
+
+def chunked_search_file(pattern, path, workers=None):
+    """Return the (start, end) of the leftmost longest match in the
+    file at path, or None if there is none.
+
+    Each worker maps the file into memory, so the contents are never
+    copied between processes.
+    """
+    d = dfa.from_pattern(pattern, unanchored=True, reverse=True)
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped.
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                futures = [
+                    pool.submit(_summarize_reverse_file, d, path, lo, hi)
+                    for lo, hi in _bounds(len(data), workers)
+                ]
+                start = _join_reverse(d, [f.result() for f in futures])
+            return _span(pattern, data, start)
+
+
+def chunked_search(pattern, data, workers=None):
+    """Return the (start, end) of the leftmost longest match in data,
+    or None if there is none."""
+    d = dfa.from_pattern(pattern, unanchored=True, reverse=True)
+    data = nfa.prepare_input(data)[0]
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_summarize_reverse, d, _chunk(data, lo, hi), 0,
+                        hi - lo, lo)
+            for lo, hi in _bounds(len(data), workers)
+        ]
+        start = _join_reverse(d, [f.result() for f in futures])
+    return _span(pattern, data, start)
+
+
+def _span(pattern, data, start):
+    "Find the end of the leftmost longest match, given its start."
+    if start < 0:
+        return None
+    end = dfa.from_pattern(pattern).match_end(data, start)
+    if end < 0:
+        raise RuntimeError('reversed DFA found a start with no match')
+    return (start, end)
+
+
+def _bounds(length, n):
+    "Return the (start, end) of n nearly equal chunks."
+    size = -(-length // n) or 1
+    return [(lo, min(lo + size, length)) for lo in range(0, length, size)]
+
+
+def _chunk(data, lo, hi):
+    chunk = data[lo:hi]
+    if not isinstance(chunk, (str, bytes)):
+        # memoryviews cannot be pickled.
+        chunk = bytes(chunk)
+    return chunk
+
+
+def _summarize(d, s, lo, hi, offset):
+    """Run s[lo:hi] from every state of the DFA d.
+
+    Returns two lists indexed by the starting state. first gives the
+    end of the first match plus offset, or -1, and final gives the
+    state at the end of the chunk for the runs that did not match.
+    """
+    s, binary = nfa.prepare_input(s)
+    classes = d.classes
+    table = d.table
+    accept = d.accept
+    nclasses = d.nclasses
+    first = [-1] * d.nstates
+    final = [-1] * d.nstates
+
+    # Map each state being followed to the starting states that led
+    # to it.
+    current = {q: [q] for q in range(d.nstates)}
+    i = lo
+    while i < hi and len(current) > 1:
+        code = s[i] if binary else ord(s[i])
+        cls = classes.get(code, dfa.OTHER)
+        following = {}
+        for q, starts in current.items():
+            t = table[q * nclasses + cls]
+            if accept[t]:
+                for r in starts:
+                    first[r] = i + 1 + offset
+            else:
+                following.setdefault(t, []).extend(starts)
+        current = following
+        i += 1
+
+    if len(current) == 1:
+        # Everything left has merged into one run, so finish the chunk
+        # the same way dfa.DFA.search_end() does.
+        [(state, starts)] = current.items()
+        end = -1
+        while i < hi:
+            code = s[i] if binary else ord(s[i])
+            state = table[state * nclasses + classes.get(code, dfa.OTHER)]
+            i += 1
+            if accept[state]:
+                end = i + offset
+                break
+        if end >= 0:
+            for r in starts:
+                first[r] = end
+            current = {}
+        else:
+            current = {state: starts}
+
+    for q, starts in current.items():
+        for r in starts:
+            final[r] = q
+    return (first, final)
+
+
+def _join(d, summaries):
+    "Follow the chunk summaries from the start state of d."
+    state = d.start
+    for first, final in summaries:
+        if first[state] >= 0:
+            return first[state]
+        state = final[state]
+    return -1
+
+
+# Finding where the leftmost match starts.
+#
+# The unanchored DFA for the reversed pattern, run backwards from the
+# end of the input, accepts at every position where a match begins.
+# The last place it accepts is the start of the leftmost match, and
+# running the anchored DFA forward from there finds the end of the
+# longest one. The backwards scan is split into chunks the same way,
+# but each summary records the last accepting position for every
+# starting state instead of the first, so the whole chunk is read.
+
+def _summarize_reverse_file(d, path, lo, hi):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _summarize_reverse(d, data, lo, hi, 0)
+
+
+def _summarize_reverse(d, s, lo, hi, offset):
+    """Run s[lo:hi] backwards from every state of the reversed DFA d.
+
+    Returns two lists indexed by the starting state. last gives the
+    lowest position, plus offset, where the run accepted, or -1, and
+    final gives the state at the beginning of the chunk.
+    """
+    s, binary = nfa.prepare_input(s)
+    classes = d.classes
+    table = d.table
+    accept = d.accept
+    nclasses = d.nclasses
+    last = [-1] * d.nstates
+    final = [-1] * d.nstates
+
+    current = {q: [q] for q in range(d.nstates)}
+    i = hi - 1
+    while i >= lo and len(current) > 1:
+        code = s[i] if binary else ord(s[i])
+        cls = classes.get(code, dfa.OTHER)
+        following = {}
+        for q, starts in current.items():
+            t = table[q * nclasses + cls]
+            if accept[t]:
+                for r in starts:
+                    last[r] = i + offset
+            following.setdefault(t, []).extend(starts)
+        current = following
+        i -= 1
+
+    if len(current) == 1:
+        [(state, starts)] = current.items()
+        found = -1
+        while i >= lo:
+            code = s[i] if binary else ord(s[i])
+            state = table[state * nclasses + classes.get(code, dfa.OTHER)]
+            if accept[state]:
+                found = i + offset
+            i -= 1
+        if found >= 0:
+            for r in starts:
+                last[r] = found
+        current = {state: starts}
+
+    for q, starts in current.items():
+        for r in starts:
+            final[r] = q
+    return (last, final)
+
+
+def _join_reverse(d, summaries):
+    """Follow the summaries from _summarize_reverse(), given in the
+    order of the chunks, backwards from the start state of d."""
+    state = d.start
+    start = -1
+    for last, final in reversed(summaries):
+        if last[state] >= 0:
+            start = last[state]
+        state = final[state]
+    return start
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Match many patterns at once by combining them into one automaton.
+#
+# Each pattern is compiled to a program.Program and the programs are
+# joined with program.union(), which tags every match state with the
+# index of the pattern it came from. One pass over the input with the
+# combined automaton tells us which of the patterns match.
+
+import lazydfa
+import nfa
+import program
+
+
+class PatternSet:
+    """A set of patterns identified by their position in the list.
+
+    When use_dfa is true (the default) the combined automaton is run
+    as a lazily built DFA, otherwise the NFA states are simulated
+    directly.
+    """
+
+    def __init__(self, patterns, use_dfa=True,
+                 max_states=lazydfa.DEFAULT_MAX_STATES):
+        self.patterns = [nfa.compile(p, engine='pikevm') for p in patterns]
+        self.prog = program.union([p.program for p in self.patterns])
+        self.dfa = None
+        if use_dfa:
+            self.dfa = lazydfa.LazyDFA(
+                self.prog, unanchored=True, max_states=max_states)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __repr__(self):
+        return 'PatternSet({!r})'.format(
+            [p.pattern for p in self.patterns])
+
+    def matches(self, s):
+        "Return the sorted ids of the patterns that match anywhere in s."
+        if self.dfa is not None:
+            found = self._run_dfa(s)
+        else:
+            found = self._run_nfa(s)
+        return sorted(found)
+
+    def search(self, s):
+        """Return a dict mapping the id of each pattern that matches s
+        to its nfa.Match.
+
+        The combined automaton decides which patterns match, then only
+        those are run again to find their groups.
+        """
+        return {
+            i: self.patterns[i].search(s)
+            for i in self.matches(s)
+        }
+
+    def _run_dfa(self, s):
+        dfa = self.dfa
+        d = dfa.start
+        found = set()
+        for code in _codes(s):
+            d = dfa.step(d, code)
+            if d.tags:
+                found.update(d.tags)
+                if len(found) == len(self.patterns):
+                    # Every pattern has matched, so stop reading.
+                    break
+        return found
+
+    def _run_nfa(self, s):
+        prog = self.prog
+        op = prog.op
+        char = prog.char
+        out1 = prog.out1
+        start_states = prog.closure([prog.start])
+        current = frozenset()
+        found = set()
+        for code in _codes(s):
+            current = prog.closure(
+                out1[pc]
+                for pc in current | start_states
+                if op[pc] == program.CHAR and char[pc] == code
+            )
+            for pc in current:
+                if op[pc] == program.MATCH:
+                    found.add(char[pc])
+            if len(found) == len(self.patterns):
+                break
+        return found
+
+
+def _codes(s):
+    "Iterate over the code points of the characters or bytes in s."
+    s, binary = nfa.prepare_input(s)
+    if binary:
+        return iter(s)
+    return map(ord, s)
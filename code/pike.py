@@ -38,3 +38,66 @@ def match_star(c, regexp, text):
             break
         text = text[1:]  # consuming memory
     return False
+
+
+# The functions above copy the rest of the text each time they consume
+# a character, and match_here() calls itself once per character, so
+# long inputs run out of stack. This version keeps its own stack of
+# the choices left to try, as (regexp position, text position) pairs,
+# so it only needs constant Python stack depth. It also works on
+# bytes-like inputs such as an mmap.mmap without copying them, with
+# each byte compared as the character with the same code point.
+# Nothing is printed.
+
+# Imported here to leave the code from the article above untouched.
+import tracing
+
+
+def match_iterative(regexp, text):
+    "Return True if regexp matches somewhere in text."
+    if regexp and regexp[0] == '^':
+        return _run(regexp, text, [(1, 0)])
+    return _run(regexp, text, [(0, start) for start in
+                               reversed(range(len(text)))])
+
+
+def match_bytes(regexp, data):
+    "Return True if regexp matches somewhere in the bytes-like data."
+    return match_iterative(regexp, data)
+
+
+def _run(regexp, text, todo):
+    binary = not isinstance(text, str)
+    # A pair that has already failed will fail again, so skip it. This
+    # also stops patterns like a*a*a*b from taking exponential time.
+    tried = set()
+    tracer = tracing.current.get()
+    while todo:
+        if tracer is not None:
+            tracer('pike.step', depth=len(todo))
+        state = todo.pop()
+        if state in tried:
+            continue
+        tried.add(state)
+        ri, ti = state
+        if ri == len(regexp):
+            return True
+        if ri + 1 < len(regexp) and regexp[ri + 1] == '*':
+            # Like match_star(), try matching nothing first, then one
+            # more character. The stack is last in, first out.
+            c = regexp[ri]
+            if ti < len(text):
+                t = chr(text[ti]) if binary else text[ti]
+                if c in ['.', t]:
+                    todo.append((ri, ti + 1))
+            todo.append((ri + 2, ti))
+            continue
+        if ri + 1 == len(regexp) and regexp[ri] == '$':
+            if ti == len(text):
+                return True
+            continue
+        if ti < len(text):
+            t = chr(text[ti]) if binary else text[ti]
+            if regexp[ri] in ['.', t]:
+                todo.append((ri + 1, ti + 1))
+    return False
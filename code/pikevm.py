@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# A Pike VM style simulation of an NFA, based on
+# https://swtch.com/~rsc/regexp/regexp2.html
+#
+# Instead of remembering the whole traversal in a chain of Path
+# objects, each thread carries a fixed size tuple of capture slots
+# holding the positions each group covers. The tuple is replaced
+# (never modified) when a character is consumed, so threads that split
+# from the same parent can safely share it. The text of the groups is
+# sliced from the input once the match is known.
+#
+# The VM runs on the numbered states of a program.Program.
+
+import nfa
+import program
+import tracing
+
+# Each group uses 4 slots: the start position, the end position, the
+# start of the run of characters the group is consuming now, and the
+# earlier runs. A group inside a repetition may skip over characters
+# that belong to other parts of the pattern, so its text is not always
+# the input between its start and end. The earlier runs are kept as a
+# chain of (earlier, start, end) tuples, or None, so adding one does
+# not copy the others.
+SLOTS_PER_GROUP = 4
+
+
+class PikeVM:
+    "Match a Program using threads with capture slots."
+
+    def __init__(self, prog):
+        self.prog = prog
+        self.ngroups = max(prog.ngroups, 1)
+        self.empty = (-1, -1, -1, None) * self.ngroups
+        # Look up the groups for each state once instead of decoding
+        # the bitmask every time a character is consumed.
+        self.state_groups = [
+            prog.group_numbers(pc) for pc in range(len(prog))
+        ]
+
+    def match(self, s, pos=0):
+        "Match only at pos, returning an nfa.Match or None."
+        return self._run(s, pos, anchored=True)
+
+    def search(self, s, pos=0, prefilter=None):
+        """Find the leftmost longest match at or after pos.
+
+        If a prefilter.Prefilter is given, threads are only started
+        where the required prefix appears.
+        """
+        return self._run(s, pos, anchored=False, prefilter=prefilter)
+
+    def _run(self, s, pos, anchored, prefilter=None):
+        s, binary = nfa.prepare_input(s)
+        op = self.prog.op
+        char = self.prog.char
+        out1 = self.prog.out1
+        state_groups = self.state_groups
+        tracer = tracing.current.get()
+
+        clist = []
+        seen = set()
+        best = None
+
+        i = pos
+        while i < len(s):
+            # Until something matches, start a new thread here. It
+            # goes after the existing threads, so a state that has
+            # already been reached from an earlier start is not added
+            # again.
+            if best is None and (i == pos or not anchored):
+                if prefilter is not None and not clist:
+                    # Nothing is running, so jump ahead to the next
+                    # place a match could begin.
+                    i = prefilter.next_start(s, i)
+                    if i < 0:
+                        break
+                if prefilter is None or prefilter.can_start(s, i):
+                    self._add(clist, seen, self.prog.start,
+                              (i,) + self.empty[1:])
+            if not clist:
+                if anchored or best is not None:
+                    break
+                i += 1
+                continue
+
+            if tracer is not None:
+                tracer('pikevm.step', i=i, threads=len(clist))
+            code = s[i] if binary else ord(s[i])
+            nlist = []
+            seen = set()
+            for pc, caps in clist:
+                if op[pc] == program.CHAR and char[pc] == code:
+                    self._add(nlist, seen, out1[pc],
+                              _consume(caps, state_groups[pc], i))
+
+            clist = []
+            for thread in nlist:
+                pc, caps = thread
+                if op[pc] == program.MATCH:
+                    # There is only one match state and it can only be
+                    # on the list once, so a later match is either
+                    # longer or starts further left.
+                    if best is None or caps[0] <= best[0]:
+                        if tracer is not None:
+                            tracer('pikevm.match', i=i, start=caps[0])
+                        best = caps
+                elif best is None or caps[0] <= best[0]:
+                    # Threads that started to the right of a match can
+                    # never produce the leftmost result.
+                    clist.append(thread)
+            i += 1
+
+        if best is None:
+            return None
+        return nfa.Match(s, None, self._groups(s, best))
+
+    def _add(self, threads, seen, pc, caps):
+        """Add the character and match states reachable from pc to
+        threads, following out1 before out2."""
+        op = self.prog.op
+        out1 = self.prog.out1
+        out2 = self.prog.out2
+        todo = [pc]
+        while todo:
+            pc = todo.pop()
+            if pc in seen:
+                continue
+            seen.add(pc)
+            if op[pc] == program.SPLIT:
+                # Push out2 first so out1 is handled first.
+                todo.append(out2[pc])
+                todo.append(out1[pc])
+            else:
+                threads.append((pc, caps))
+
+    def _groups(self, s, caps):
+        "Convert the capture slots to the text and extents of a Match."
+        text = {}
+        extents = {}
+        for g in range(self.ngroups):
+            k = g * SLOTS_PER_GROUP
+            if caps[k + 1] == -1:
+                # The group did not take part in the match.
+                continue
+            extents[g] = (caps[k], caps[k + 1])
+            pieces = [nfa._slice(s, caps[k + 2], caps[k + 1])]
+            runs = caps[k + 3]
+            while runs is not None:
+                runs, start, end = runs
+                pieces.append(nfa._slice(s, start, end))
+            pieces.reverse()
+            text[g] = pieces[0][:0].join(pieces)
+        return (text, extents)
+
+
+def _consume(caps, groups, i):
+    "Return new capture slots after consuming the character at i."
+    caps = list(caps)
+    for g in groups:
+        k = g * SLOTS_PER_GROUP
+        # Only move the start position if we haven't started this group
+        # before. The end is always one past the latest character.
+        if caps[k] == -1:
+            caps[k] = caps[k + 2] = i
+        elif caps[k + 1] != i:
+            # Something outside the group was consumed since the last
+            # character, so the current run is over.
+            caps[k + 3] = (caps[k + 3], caps[k + 2], caps[k + 1])
+            caps[k + 2] = i
+        caps[k + 1] = i + 1
+    return tuple(caps)
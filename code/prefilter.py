@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Find literal text that every match of a pattern must contain, so a
+# search can use str.find() to skip the parts of the input where no
+# match is possible before running an automaton. bytes, bytearray,
+# and mmap inputs have a find() method too.
+#
+# The postfix tokens are evaluated with a stack, the same way
+# nfa.post2nfa() builds fragments, but instead of states each entry
+# describes the strings its subexpression can match.
+
+import collections
+import os
+
+import nfa
+
+# What we know about the strings matched by one subexpression. exact
+# is the only string it can match, or None if there is more than one.
+# prefix and suffix are literal text every match starts and ends with,
+# and factor is the longest literal text every match contains.
+Literals = collections.namedtuple(
+    'Literals', ['exact', 'prefix', 'suffix', 'factor'])
+
+NOTHING_KNOWN = Literals(None, '', '', '')
+
+
+def literals(tokens):
+    "Compute the Literals for a pattern from its postfix tokens."
+    stack = []
+    for t in tokens:
+        if t.op == nfa.LITERAL:
+            stack.append(Literals(t.text, t.text, t.text, t.text))
+
+        elif t.op == nfa.CONCAT:
+            b = stack.pop()
+            a = stack.pop()
+            exact = None
+            if a.exact is not None and b.exact is not None:
+                exact = a.exact + b.exact
+            prefix = a.prefix
+            if a.exact is not None:
+                prefix = a.exact + b.prefix
+            suffix = b.suffix
+            if b.exact is not None:
+                suffix = a.suffix + b.exact
+            # Text can be required by either side, or span the place
+            # where they join.
+            factor = _longest(a.factor, b.factor, a.suffix + b.prefix)
+            stack.append(Literals(exact, prefix, suffix, factor))
+
+        elif t.op == nfa.ALTERNATE:
+            b = stack.pop()
+            a = stack.pop()
+            exact = a.exact if a.exact == b.exact else None
+            prefix = os.path.commonprefix([a.prefix, b.prefix])
+            suffix = os.path.commonprefix(
+                [a.suffix[::-1], b.suffix[::-1]])[::-1]
+            stack.append(Literals(exact, prefix, suffix,
+                                  _longest(prefix, suffix)))
+
+        elif t.op == nfa.AT_LEAST_ONE:
+            # At least one copy is required, but we cannot tell how
+            # many there will be.
+            e = stack.pop()
+            stack.append(Literals(None, e.prefix, e.suffix, e.factor))
+
+        elif t.op in (nfa.AT_LEAST_ZERO, nfa.AT_MOST_ONE):
+            # The subexpression may not appear at all.
+            stack.pop()
+            stack.append(NOTHING_KNOWN)
+
+        else:
+            raise ValueError('Unhandled token {}'.format(t))
+
+    if len(stack) != 1:
+        raise ValueError(stack)
+    return stack[0]
+
+
+def _longest(*candidates):
+    return max(candidates, key=len)
+
+
+class Prefilter:
+    """Use required literal text to find where a match could start.
+
+    skipped counts the input positions the matchers did not have to
+    look at because of the prefilter.
+    """
+
+    def __init__(self, prefix, factor):
+        self.prefix = prefix
+        self.factor = factor
+        # The same text for searching bytes-like input, where each byte
+        # stands for the character with the same code point.
+        try:
+            self.bprefix = prefix.encode('latin-1')
+            self.bfactor = factor.encode('latin-1')
+        except UnicodeEncodeError:
+            # The pattern needs a character no byte can match.
+            self.bprefix = self.bfactor = None
+        self.skipped = 0
+
+    @classmethod
+    def from_postfix(cls, tokens):
+        "Return a Prefilter for the pattern, or None if it has no literals."
+        found = literals(tokens)
+        if not found.factor:
+            return None
+        return cls(found.prefix, found.factor)
+
+    def __repr__(self):
+        return 'Prefilter(prefix={!r}, factor={!r})'.format(
+            self.prefix, self.factor)
+
+    def rejects(self, s, pos=0):
+        "Return True if s cannot match anywhere at or after pos."
+        factor = self.factor
+        if not isinstance(s, str):
+            factor = self.bfactor
+            if factor is not None and not hasattr(s, 'find'):
+                # memoryview cannot search, so assume it might match.
+                return False
+        if factor is None or s.find(factor, pos) < 0:
+            self.skipped += max(len(s) - pos, 0)
+            return True
+        return False
+
+    def can_start(self, s, i):
+        "Return True if a match could begin at position i."
+        if isinstance(s, str):
+            return s.startswith(self.prefix, i)
+        if self.bprefix is None:
+            return False
+        # Slicing works for every bytes-like type, but mmap has no
+        # startswith().
+        return s[i:i + len(self.bprefix)] == self.bprefix
+
+    def next_start(self, s, i):
+        """Return the first position at or after i where a match could
+        begin, or -1 if there is none."""
+        prefix = self.prefix
+        if not isinstance(s, str):
+            prefix = self.bprefix
+            if prefix is None:
+                return -1
+            if not hasattr(s, 'find'):
+                return i
+        if not prefix:
+            return i
+        found = s.find(prefix, i)
+        self.skipped += (found if found >= 0 else len(s)) - i
+        return found
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+# A compact form of the NFA built by nfa.post2nfa().
+#
+# The State objects are convenient for building and drawing the NFA,
+# but each one carries a Token, a list of groups, and references to
+# other objects. A Program numbers the states 0..N-1 and stores each
+# property in its own column, so the matchers can work with integer
+# indexes instead of walking an object graph. Programs hold only
+# arrays and tuples, so they can also be pickled.
+
+import array
+
+import nfa
+
+# Opcodes
+CHAR = 0   # consume one character and go to out1
+SPLIT = 1  # continue at both out1 and out2 without consuming anything
+MATCH = 2  # the end of a successful match
+
+# Used in the out columns when there is no link.
+NONE = -1
+
+
+class Program:
+    """An NFA stored in parallel columns indexed by state number.
+
+    For CHAR states char holds the code point to match. For MATCH
+    states it holds a tag, so several match states can be told apart.
+    groups holds a bitmask of the groups each state belongs to. Groups
+    may be numbered beyond 63, so the masks are kept as Python ints
+    rather than in a fixed width array.
+    """
+
+    def __init__(self, op, char, out1, out2, groups, start=0):
+        self.op = op
+        self.char = char
+        self.out1 = out1
+        self.out2 = out2
+        self.groups = groups
+        self.start = start
+        self.ngroups = max(groups, default=0).bit_length()
+
+    def __len__(self):
+        return len(self.op)
+
+    def __repr__(self):
+        return 'Program(states={}, groups={})'.format(
+            len(self), self.ngroups)
+
+    def dump(self):
+        "Return a readable listing of the program."
+        names = {CHAR: 'char', SPLIT: 'split', MATCH: 'match'}
+        lines = []
+        for pc in range(len(self)):
+            lines.append('{:4d} {:5s} {!r:6} {:4d} {:4d} {:b}'.format(
+                pc,
+                names[self.op[pc]],
+                chr(self.char[pc]) if self.op[pc] == CHAR else '',
+                self.out1[pc],
+                self.out2[pc],
+                self.groups[pc],
+            ))
+        return '\n'.join(lines)
+
+    def group_numbers(self, pc):
+        "Return the list of groups that state pc belongs to."
+        mask = self.groups[pc]
+        found = []
+        g = 0
+        while mask:
+            if mask & 1:
+                found.append(g)
+            mask >>= 1
+            g += 1
+        return found
+
+    def closure(self, pcs):
+        """Return the set of CHAR and MATCH states reachable from pcs
+        without consuming input."""
+        op = self.op
+        out1 = self.out1
+        out2 = self.out2
+        found = set()
+        seen = set()
+        todo = list(pcs)
+        while todo:
+            pc = todo.pop()
+            if pc in seen:
+                continue
+            seen.add(pc)
+            if op[pc] == SPLIT:
+                todo.append(out1[pc])
+                todo.append(out2[pc])
+            else:
+                found.add(pc)
+        return frozenset(found)
+
+
+def union(progs):
+    """Combine several Programs into one that matches any of them.
+
+    The match state of each program is tagged with its position in
+    progs. The new start state is the first of a chain of splits that
+    leads to the start of each program in order.
+    """
+    if not progs:
+        raise ValueError('union() needs at least one program')
+
+    nsplits = len(progs) - 1
+    op = array.array('b', [SPLIT] * nsplits)
+    char = array.array('l', [NONE] * nsplits)
+    out1 = array.array('l')
+    out2 = array.array('l')
+    groups = [0] * nsplits
+
+    # Work out where each program will start once they are placed one
+    # after another following the splits.
+    offsets = []
+    offset = nsplits
+    for p in progs:
+        offsets.append(offset)
+        offset += len(p)
+
+    for k in range(nsplits):
+        out1.append(offsets[k] + progs[k].start)
+        if k + 1 < nsplits:
+            out2.append(k + 1)
+        else:
+            out2.append(offsets[k + 1] + progs[k + 1].start)
+
+    for tag, (p, offset) in enumerate(zip(progs, offsets)):
+        for pc in range(len(p)):
+            op.append(p.op[pc])
+            if p.op[pc] == MATCH:
+                char.append(tag)
+            else:
+                char.append(p.char[pc])
+            for column, links in ((out1, p.out1), (out2, p.out2)):
+                link = links[pc]
+                column.append(link + offset if link != NONE else NONE)
+        groups.extend(p.groups)
+
+    start = 0 if nsplits else offsets[0] + progs[0].start
+    return Program(op, char, out1, out2, tuple(groups), start)
+
+
+def from_pattern(pattern, reverse=False):
+    """Parse a pattern and build the Program for it.
+
+    If reverse is true, the Program matches the same strings read
+    backwards.
+    """
+    pf = nfa.postfix(nfa.tokenize(pattern))
+    if reverse:
+        pf = nfa.reverse_postfix(pf)
+    start, all_states = nfa.post2nfa(pf)
+    return from_nfa(start)
+
+
+def from_nfa(start):
+    """Number the states reachable from start and build a Program.
+
+    States are numbered in the order they are found by following out1
+    before out2, so the start state is always 0.
+    """
+    numbers = {}
+    order = []
+    todo = [start]
+    while todo:
+        s = todo.pop()
+        if s is None or s in numbers:
+            continue
+        numbers[s] = len(order)
+        order.append(s)
+        todo.append(s.out2)
+        todo.append(s.out1)
+
+    op = array.array('b')
+    char = array.array('l')
+    out1 = array.array('l')
+    out2 = array.array('l')
+    groups = []
+    for s in order:
+        token = s.token
+        if token.op == nfa.LITERAL:
+            op.append(CHAR)
+            char.append(ord(token.text))
+        elif token.op == nfa.MATCH:
+            op.append(MATCH)
+            char.append(0)
+        elif token.op in nfa.SPLIT_OPS:
+            op.append(SPLIT)
+            char.append(NONE)
+        else:
+            raise ValueError('unhandled state {}'.format(s))
+        out1.append(numbers[s.out1] if s.out1 is not None else NONE)
+        out2.append(numbers[s.out2] if s.out2 is not None else NONE)
+        mask = 0
+        for g in token.groups:
+            mask |= 1 << g
+        groups.append(mask)
+
+    return Program(op, char, out1, out2, tuple(groups))
@@ -13,8 +13,11 @@
 # <base> ::= <char>
 #            |  '(' <regex> ')'
 
+import functools
 import logging
 
+import tracing
+
 
 def parse(input):
 
@@ -99,27 +102,85 @@ class Matchable:
                 return match
         return None
 
+    def match_bytes(self, data):
+        """Match against bytes-like data such as an mmap.mmap.
+
+        Each byte is compared as the character with the same code
+        point, and the group text is bytes.
+        """
+        if isinstance(data, memoryview):
+            data = data.cast('B')
+        for start in range(len(data)):
+            m, consumed, match = self._match(data, start, Match(b''))
+            if m:
+                return match
+        return None
+
+    def memo_match(self, text):
+        """Match like match(), but remember the result of each node at
+        each position.
+
+        Choice and Repetition can try the same node at the same
+        position many times, and so can the loop over the start
+        positions. Here each of those is only worked out once, so the
+        work is bounded by the number of nodes times the length of the
+        text. The results should be the same as match().
+        """
+        memo = {}
+        for start in range(len(text)):
+            m, consumed, found = self._memo_match(text, start, memo)
+            if m:
+                return Match.from_trail(_empty(text), found)
+        return None
+
+    def _memo_match(self, text, start, memo):
+        # The cached value holds only what this node consumed, because
+        # the Match passed in to _match() depends on how we got here.
+        # It is kept as a trail that nodes can share, and is only
+        # turned into a Match at the end. See _join().
+        key = (self, start)
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
+        result = memo[key] = self._match_here(text, start, memo)
+        return result
+
+
+def _empty(text):
+    "Return the empty str or bytes to build group text for text."
+    return '' if isinstance(text, str) else b''
+
 
 class Match:
 
-    def __init__(self):
-        self.text = {0: ''}
+    # The stats.Stats for the call that found this match, when it was
+    # run with stats.run().
+    stats = None
+
+    def __init__(self, empty=''):
+        # The empty str or bytes, depending on the input.
+        self.empty = empty
+        self.text = {0: empty}
         self.extents = {}
 
     def add(self, substr, start, end, groups):
-        logging.debug('Match.add({!r}, {}, {}, {})'.format(
-            substr, start, end, groups))
-        logging.debug('  before text: {}'.format(self.text))
-        logging.debug('  before extents: {}'.format(self.extents))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.add', match=self, substr=substr, start=start,
+                   end=end, groups=groups)
         for g in groups:
 
-            existing = self.text.get(g, '')
+            existing = self.text.get(g, self.empty)
             self.text[g] = existing + substr
 
             # Use -1 to indicate a position we have not yet filled in.
             new_start, new_end = self.extents.get(g, (-1, -1))
-            logging.debug('  extent {}: {}, {}'.format(
-                g, new_start, new_end))
+            if tracer is not None:
+                tracer('rd.extent', group=g, start=new_start, end=new_end)
             # Only move the start position if we haven't started this
             # extent before.
             if new_start == -1:
@@ -129,20 +190,67 @@ class Match:
                 new_end = end
             self.extents[g] = (new_start, new_end)
 
-        logging.debug('  after text: {}'.format(self.text))
-        logging.debug('  after extents: {}'.format(self.extents))
+        if tracer is not None:
+            tracer('rd.added', match=self)
 
     def dupe(self):
-        c = Match()
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.dupe', match=self)
+        c = Match(self.empty)
         c.text = dict(self.text)
         c.extents = dict(self.extents)
         return c
 
+    @classmethod
+    def from_trail(cls, empty, trail):
+        """Return a Match for a trail built with _join(), the same as
+        if add() had been called for each piece in order."""
+        pieces = {}
+        extents = {}
+        todo = [trail]
+        while todo:
+            node = todo.pop()
+            if node is None:
+                continue
+            if len(node) == 2:
+                todo.append(node[1])
+                todo.append(node[0])
+                continue
+            substr, start, groups = node
+            end = start + len(substr)
+            for g in groups:
+                pieces.setdefault(g, []).append(substr)
+                new_start, new_end = extents.get(g, (start, end))
+                extents[g] = (new_start, max(new_end, end))
+        match = cls(empty)
+        for g, found in pieces.items():
+            match.text[g] = empty.join(found)
+        match.extents = extents
+        return match
+
+
+def _join(first, second):
+    """Return a trail for what first consumed followed by second.
+
+    A trail is None when nothing was consumed, a (substr, start,
+    groups) tuple for one piece of text, or a (first, second) pair of
+    trails. Joining them never copies the pieces, so the memoized
+    results can share them.
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return (first, second)
+
 
 class Choice(Matchable):
 
     def _match(self, text, start, match):
-        logging.debug('{}.match({!r}, {})'.format(self, text, start))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
         for candidate in [self.a, self.b]:
             m, consumed, sub_match = candidate._match(
                 text, start, match.dupe())
@@ -150,6 +258,24 @@ class Choice(Matchable):
                 return (m, consumed, sub_match)
         return (False, start, match)
 
+    def _match_here(self, text, start, memo):
+        for candidate in [self.a, self.b]:
+            m, consumed, found = candidate._memo_match(text, start, memo)
+            if m:
+                return (m, consumed, found)
+        return (False, start, None)
+
+    def _compile(self, binary):
+        a = self.a._compile(binary)
+        b = self.b._compile(binary)
+
+        def choice(text, start, trail):
+            end = a(text, start, trail)
+            if end >= 0:
+                return end
+            return b(text, start, trail)
+        return choice
+
     def __init__(self, a, b, groups):
         self.a = a
         self.b = b
@@ -163,7 +289,9 @@ class Choice(Matchable):
 class Concatenate(Matchable):
 
     def _match(self, text, start, match):
-        logging.debug('{}.match({!r}, {})'.format(self, text, start))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
         m, consumed, sub_match = self.first._match(
             text, start, match.dupe())
         if not m:
@@ -174,6 +302,54 @@ class Concatenate(Matchable):
             return (False, start, match)
         return (m, consumed, sub_match2)
 
+    def _match_here(self, text, start, memo):
+        m, consumed, first = self.first._memo_match(text, start, memo)
+        if not m:
+            return (False, start, None)
+        m, consumed, second = self.second._memo_match(text, consumed, memo)
+        if not m:
+            return (False, start, None)
+        return (m, consumed, _join(first, second))
+
+    def _compile(self, binary):
+        # Flatten nested Concatenates into one list of steps, dropping
+        # the Blanks the parser starts each term with, and join runs
+        # of characters in the same groups into one literal.
+        steps = []
+        for node in self._parts():
+            if isinstance(node, Blank):
+                continue
+            if (isinstance(node, Primitive) and steps and
+                    isinstance(steps[-1], Run) and
+                    steps[-1].groups == node.groups):
+                steps[-1].text += node.c
+            elif isinstance(node, Primitive):
+                steps.append(Run(node.c, node.groups))
+            else:
+                steps.append(node)
+        steps = [s._compile(binary) for s in steps]
+        if not steps:
+            return Blank(self.groups)._compile(binary)
+        if len(steps) == 1:
+            return steps[0]
+
+        def concatenate(text, start, trail):
+            undo = len(trail)
+            for step in steps:
+                start = step(text, start, trail)
+                if start < 0:
+                    del trail[undo:]
+                    return -1
+            return start
+        return concatenate
+
+    def _parts(self):
+        for node in (self.first, self.second):
+            if isinstance(node, Concatenate):
+                yield from node._parts()
+            else:
+                yield node
+
     def __init__(self, first, second, groups):
         self.first = first
         self.second = second
@@ -188,9 +364,19 @@ class Concatenate(Matchable):
 class Blank(Matchable):
 
     def _match(self, text, start, match):
-        logging.debug('{}.match({!r}, {})'.format(self, text, start))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
         return (True, start, match)
 
+    def _match_here(self, text, start, memo):
+        return (True, start, None)
+
+    def _compile(self, binary):
+        def blank(text, start, trail):
+            return start
+        return blank
+
     def __init__(self, groups):
         self.groups = groups
         logging.debug(self)
@@ -208,7 +394,9 @@ class Repetition(Matchable):
         logging.debug(self)
 
     def _match(self, text, start, match):
-        logging.debug('{}.match({!r}, {})'.format(self, text, start))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
         m, consumed, sub_match = self.internal._match(
             text, start, match.dupe())
         while m:
@@ -216,6 +404,43 @@ class Repetition(Matchable):
                 text, consumed, sub_match.dupe())
         return (True, consumed, sub_match)
 
+    def _match_here(self, text, start, memo):
+        # Matching here is the body followed by the repetition from
+        # where the body ended. Follow the body until it stops, or
+        # reaches a position the repetition has already been worked
+        # out from, then fill in the results for the positions passed
+        # on the way back.
+        bodies = []
+        consumed = start
+        while True:
+            if consumed != start and (self, consumed) in memo:
+                m, end, found = memo[(self, consumed)]
+                break
+            m, end, body = self.internal._memo_match(text, consumed, memo)
+            # Stop if the body can match without consuming anything,
+            # instead of looping forever.
+            if not m or end == consumed:
+                end, found = consumed, None
+                break
+            bodies.append((consumed, body))
+            consumed = end
+        for position, body in reversed(bodies):
+            found = _join(body, found)
+            if position != start:
+                memo[(self, position)] = (True, end, found)
+        return (True, end, found)
+
+    def _compile(self, binary):
+        internal = self.internal._compile(binary)
+
+        def repetition(text, start, trail):
+            while True:
+                end = internal(text, start, trail)
+                if end < 0 or end == start:
+                    return start
+                start = end
+        return repetition
+
     def __str__(self):
         return 'Repetition({}, {})'.format(self.internal, self.groups)
 
@@ -224,15 +449,306 @@ class Primitive(Matchable):
 
     def __init__(self, c, groups):
         self.c = c
+        # Bytes-like input gives integers, so also keep the code point
+        # and the byte to compare and record.
+        self.code = ord(c)
+        self.b = bytes([self.code]) if self.code < 256 else None
         self.groups = groups
         logging.debug(self)
 
     def _match(self, text, start, match):
-        logging.debug('{}.match({!r}, {})'.format(self, text, start))
+        tracer = tracing.current.get()
+        if tracer is not None:
+            tracer('rd.match', node=self, text=text, start=start)
         if text[start] == self.c:
             match.add(self.c, start, start+1, self.groups)
             return (True, start+1, match)
+        if text[start] == self.code:
+            match.add(self.b, start, start+1, self.groups)
+            return (True, start+1, match)
         return (False, start, match)
 
+    def _match_here(self, text, start, memo):
+        if start < len(text):
+            if text[start] == self.c:
+                return (True, start+1, (self.c, start, self.groups))
+            if text[start] == self.code:
+                return (True, start+1, (self.b, start, self.groups))
+        return (False, start, None)
+
+    def _compile(self, binary):
+        return Run(self.c, self.groups)._compile(binary)
+
     def __str__(self):
         return 'Primitive({!r}, {})'.format(self.c, self.groups)
+
+
+class Run:
+    "Consecutive characters that all belong to the same groups."
+
+    def __init__(self, text, groups):
+        self.text = text
+        self.groups = groups
+
+    def _compile(self, binary):
+        groups = self.groups
+        literal = self.text
+        if binary:
+            try:
+                literal = literal.encode('latin-1')
+            except UnicodeEncodeError:
+                # No bytes can match this text.
+                return lambda text, start, trail: -1
+        size = len(literal)
+
+        def run(text, start, trail):
+            tracer = tracing.current.get()
+            if tracer is not None:
+                tracer('rd.run', text=text, start=start)
+            # Slicing works for every kind of input, where mmap
+            # and memoryview have no startswith().
+            if text[start:start + size] == literal:
+                trail.append((literal, start, groups))
+                return start + size
+            return -1
+        return run
+
+
+# Instead of walking the tree for every match, the nodes can be turned
+# into nested closures, one per node, that only do the work needed for
+# that pattern. They return the position where the match ended or -1,
+# and record the text they consume on a trail. When part of the
+# pattern fails, the trail is cut back to where it was, so nothing has
+# to be copied for each attempt the way Match.dupe() is.
+
+@functools.lru_cache(maxsize=128)
+def compile(pattern):
+    "Parse pattern and return a Compiled matcher for it."
+    return Compiled(parse(pattern))
+
+
+class Compiled:
+    "A parsed pattern turned into closures, to match many times."
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._str = tree._compile(binary=False)
+        self._bytes = None
+
+    def match(self, text):
+        """Match like Matchable.match(), for str or bytes-like text.
+
+        Unlike the tree, running out of text is a failed match
+        instead of an IndexError.
+        """
+        fn = self._str
+        if not isinstance(text, str):
+            if isinstance(text, memoryview):
+                text = text.cast('B')
+            if self._bytes is None:
+                self._bytes = self.tree._compile(binary=True)
+            fn = self._bytes
+        for start in range(len(text)):
+            trail = []
+            if fn(text, start, trail) >= 0:
+                match = Match(_empty(text))
+                for substr, pos, groups in trail:
+                    match.add(substr, pos, pos + len(substr), groups)
+                return match
+        return None
+
+
+# parse() and the _match() methods call themselves once for every
+# level of nesting in the pattern, and Concatenates nest once for
+# every character, so long or deeply nested patterns run out of
+# Python stack. parse_iterative() builds the same tree keeping the
+# open groups on a list, and Backtracker runs the tree as a small
+# program, keeping the choices it may come back to on a list, so
+# neither needs more Python stack for bigger patterns or inputs.
+
+def parse_iterative(input):
+    "Build the same tree as parse() without recursion."
+    group_number_n = 0
+    groups = [0]
+    # The alternatives already finished in the current group, the
+    # term being built, and the last factor, which has not been added
+    # to the term yet because a '*' may follow it.
+    alternatives = []
+    term = Blank(groups)
+    factor = None
+    # The state of the enclosing groups.
+    stack = []
+
+    def end_term():
+        if factor is None:
+            return term
+        return Concatenate(term, factor, groups)
+
+    def end_regex():
+        # parse() nests the alternatives to the right.
+        r = end_term()
+        for t in reversed(alternatives):
+            r = Choice(t, r, groups)
+        return r
+
+    for c in input:
+        if c == '*' and factor is not None:
+            factor = Repetition(factor, groups)
+        elif c == '|':
+            alternatives.append(end_term())
+            term = Blank(groups)
+            factor = None
+        elif c == ')':
+            if not stack:
+                # parse() stops at an unmatched ')'.
+                break
+            r = end_regex()
+            groups, alternatives, term = stack.pop()
+            factor = r
+        elif c == '(':
+            term = end_term()
+            stack.append((groups, alternatives, term))
+            group_number_n += 1
+            groups = groups + [group_number_n]
+            alternatives = []
+            term = Blank(groups)
+            factor = None
+        else:
+            # Anything else, including a '*' with nothing before it,
+            # is a character to match.
+            term = end_term()
+            factor = Primitive(c, groups)
+
+    if stack:
+        raise ValueError('Out of input')
+    return end_regex()
+
+
+# The instructions run by Backtracker, following the parsing machine
+# of LPeg described in "A Parsing Machine for PEGs" by Medeiros and
+# Ierusalimschy.
+CHAR = 'char'        # match one character, or fail
+CHOICE = 'choice'    # remember where to go if what follows fails
+COMMIT = 'commit'    # forget the last choice and jump
+PARTIAL = 'partial'  # update the last choice and jump back
+SUCCEED = 'succeed'  # the whole pattern matched
+
+
+def _assemble(tree):
+    "Return the list of instructions for a tree."
+    code = []
+    labels = {}
+    next_label = 0
+    todo = [tree]
+    while todo:
+        item = todo.pop()
+        if isinstance(item, int):
+            # A label, pointing at the next instruction.
+            labels[item] = len(code)
+        elif isinstance(item, tuple):
+            code.append(item)
+        elif isinstance(item, Primitive):
+            code.append((CHAR, item))
+        elif isinstance(item, Concatenate):
+            todo.append(item.second)
+            todo.append(item.first)
+        elif isinstance(item, Choice):
+            # Try a, and only if it fails, b. Once a has matched we
+            # never come back to try b, the same as Choice._match().
+            #     choice L1; <a>; commit L2; L1: <b>; L2:
+            l1, l2 = next_label, next_label + 1
+            next_label += 2
+            todo.extend(reversed([
+                (CHOICE, l1), item.a, (COMMIT, l2), l1, item.b, l2,
+            ]))
+        elif isinstance(item, Repetition):
+            # Match the body as many times as possible, and then keep
+            # going from the end of the last complete one.
+            #     choice L2; L1: <body>; partial L1; L2:
+            l1, l2 = next_label, next_label + 1
+            next_label += 2
+            todo.extend(reversed([
+                (CHOICE, l2), l1, item.internal, (PARTIAL, l1), l2,
+            ]))
+        elif not isinstance(item, Blank):
+            raise ValueError('Unhandled node {}'.format(item))
+    code.append((SUCCEED, None))
+    # Replace the labels with the instruction numbers.
+    return [
+        (op, labels[arg]) if op in (CHOICE, COMMIT, PARTIAL) else (op, arg)
+        for op, arg in code
+    ]
+
+
+class Backtracker:
+    "Match a parsed pattern using an explicit stack of choices."
+
+    def __init__(self, tree):
+        self.code = _assemble(tree)
+
+    def match(self, text):
+        """Match like Matchable.match(), for str or bytes-like text.
+
+        Unlike the tree, running out of text is a failed match
+        instead of an IndexError.
+        """
+        if isinstance(text, memoryview):
+            text = text.cast('B')
+        for start in range(len(text)):
+            trail = self._run(text, start)
+            if trail is not None:
+                match = Match(_empty(text))
+                for substr, pos, groups in trail:
+                    match.add(substr, pos, pos + 1, groups)
+                return match
+        return None
+
+    def _run(self, text, i):
+        code = self.code
+        pc = 0
+        # The characters consumed, as (text, position, groups).
+        trail = []
+        # The choices to go back to, as (instruction, position, trail
+        # length).
+        choices = []
+        tracer = tracing.current.get()
+        while True:
+            op, arg = code[pc]
+            if op == CHAR:
+                if i < len(text):
+                    t = text[i]
+                    if t == arg.c or t == arg.code:
+                        trail.append(
+                            (arg.c if t == arg.c else arg.b, i, arg.groups))
+                        i += 1
+                        pc += 1
+                        continue
+            elif op == CHOICE:
+                choices.append((arg, i, len(trail)))
+                pc += 1
+                continue
+            elif op == COMMIT:
+                choices.pop()
+                pc = arg
+                continue
+            elif op == PARTIAL:
+                alternative, last, _ = choices[-1]
+                if last == i:
+                    # The body matched without consuming anything, so
+                    # going around again would never end.
+                    choices.pop()
+                    pc += 1
+                else:
+                    choices[-1] = (alternative, i, len(trail))
+                    pc = arg
+                continue
+            elif op == SUCCEED:
+                return trail
+
+            # Fail, going back to the last choice.
+            if not choices:
+                return None
+            pc, i, length = choices.pop()
+            if tracer is not None:
+                tracer('rd.backtrack', i=i, choices=len(choices))
+            del trail[length:]
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+# Count the work the matchers do, to see why a pattern is slow.
+#
+# Stats is a tracer (see tracing.py) that only keeps counters, so
+# collecting them costs one call per event and nothing is stored per
+# step. Wrap the calls to measure in collect(), or use run() to get
+# the stats for one call attached to the match it returns:
+#
+#   m, s = stats.run(nfa.compile('(a|aa)*b').search, 'aaaaac')
+#   print(s.nfa_steps, s.peak_paths, s.time)
+#
+#   with stats.collect() as total:
+#       for line in lines:
+#           pattern.search(line)
+#
+# Each call to collect() or run() counts into a Stats of its own, which
+# is attached as the tracer for the current thread only (see
+# tracing.current), so matches measured in other threads at the same
+# time are kept apart. Stats from separate calls can be added
+# together. Counters that are peaks, like peak_paths, keep the largest
+# value instead of the sum.
+#
+# pike.match() is kept the same as the code in the article, so it
+# sends no events. When run() is given pike.match() itself, it follows
+# the match_here() calls with a profile function instead, which Python
+# only calls for the current thread, so the recursion is counted and
+# the budget applies. Inside a plain collect() it is not counted; use
+# run(), or pike.match_iterative(), which sends events.
+#
+# Not every counter applies to every engine. The ones that do not
+# stay at 0.
+#
+# The same events let a call be stopped when it does too much work,
+# so one hostile pattern or input cannot hold up a worker. Each event
+# adds to steps, roughly the work done by the engine since the last
+# one: a path, thread, or DFA moved past a character, a recursive call,
+# or a choice tried. Give collect() or run() max_steps or timeout
+# (seconds) and BudgetExceeded is raised from inside the engine once
+# either runs out, carrying the stats so far:
+#
+#   try:
+#       m, s = stats.run(p.search, text, max_steps=100000, timeout=0.5)
+#   except stats.BudgetExceeded as err:
+#       log(err.stats)
+#
+# Every engine sends events from the loop that does its work, so the
+# budget is checked as it goes, whatever the engine. pike.match() is
+# checked on each match_here() call when it is measured by run().
+
+import contextlib
+import math
+import sys
+import threading
+import time
+
+import pike
+import tracing
+
+# name -> description
+COUNTERS = {
+    'calls': 'calls measured',
+    'time': 'wall clock seconds',
+    'steps': 'units of work, checked against max_steps',
+    'nfa_steps': 'characters stepped through by nfa._match()',
+    'rd_calls': 'recursive_descent nodes tried, or literals tried by '
+                'recursive_descent.compile() matchers',
+    'dupes': 'recursive_descent Match.dupe() copies',
+    'backtracks': 'choices gone back to by recursive_descent.Backtracker',
+    'pike_steps': 'pike.match_here() calls, or states taken off the '
+                  'stack by pike.match_iterative()',
+    'pikevm_steps': 'characters stepped through by the Pike VM',
+    'dfa_steps': 'characters stepped through by the DFA and '
+                 'bit-parallel engines',
+    'cache_hits': 'lazy DFA transitions found in the cache',
+    'cache_misses': 'lazy DFA transitions computed',
+}
+
+# name -> description, for counters that keep the largest value
+PEAKS = {
+    'peak_paths': 'most paths alive in nfa._match() at once',
+    'peak_threads': 'most threads alive in the Pike VM at once',
+    'max_depth': 'deepest pike.match_here() recursion, or largest '
+                 'pike.match_iterative() stack',
+}
+
+# Held while the counts for one call are added to a Stats that may be
+# shared between threads.
+_lock = threading.Lock()
+
+
+class BudgetExceeded(ValueError):
+    """Raised when a call does more steps or takes more time than
+    allowed. The stats attribute holds the counts up to that point."""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+class Stats:
+    "Counters describing the work done by one or more matches."
+
+    def __init__(self, **values):
+        for name in list(COUNTERS) + list(PEAKS):
+            setattr(self, name, values.pop(name, 0))
+        if values:
+            raise ValueError('unknown counters {}'.format(sorted(values)))
+        # Set by collect() for the Stats of a call with a budget.
+        self._step_limit = math.inf
+        self._deadline = None
+        # Looked up once here instead of for every event.
+        self._handlers = {
+            'nfa.step': self._nfa_step,
+            'rd.match': self._rd_match,
+            'rd.run': self._rd_run,
+            'rd.dupe': self._rd_dupe,
+            'rd.backtrack': self._backtrack,
+            'pike.step': self._pike_step,
+            'pikevm.step': self._pikevm_step,
+            'dfa.step': self._dfa_step,
+            'dfa.run': self._dfa_run,
+        }
+
+    def __call__(self, event, **fields):
+        handler = self._handlers.get(event)
+        if handler is not None:
+            handler(**fields)
+
+    def __add__(self, other):
+        if not isinstance(other, Stats):
+            return NotImplemented
+        total = Stats(**self.as_dict())
+        total._add(other)
+        return total
+
+    def _add(self, other):
+        "Add the counts from other to these ones."
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in PEAKS:
+            setattr(self, name, max(getattr(self, name), getattr(other, name)))
+
+    def __radd__(self, other):
+        # Lets sum() start from 0.
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __eq__(self, other):
+        if not isinstance(other, Stats):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return 'Stats({})'.format(', '.join(
+            '{}={!r}'.format(name, value)
+            for name, value in self.as_dict().items()
+            if value
+        ))
+
+    def as_dict(self):
+        "Return the counters as a dict, for reports and JSON."
+        return {name: getattr(self, name)
+                for name in list(COUNTERS) + list(PEAKS)}
+
+    def charge(self, steps):
+        """Count steps of work, raising BudgetExceeded if the budget
+        has run out."""
+        self.steps += steps
+        if self.steps > self._step_limit:
+            raise BudgetExceeded(
+                'more than {} steps'.format(self._step_limit), self)
+        if self._deadline is not None and \
+           time.perf_counter() > self._deadline:
+            raise BudgetExceeded('out of time', self)
+
+    # Event handlers
+
+    def _nfa_step(self, paths, c, i):
+        self.nfa_steps += 1
+        if len(paths) > self.peak_paths:
+            self.peak_paths = len(paths)
+        self.charge(max(len(paths), 1))
+
+    def _rd_match(self, node, text, start):
+        self.rd_calls += 1
+        self.charge(1)
+
+    def _rd_run(self, text, start):
+        self.rd_calls += 1
+        self.charge(1)
+
+    def _rd_dupe(self, match):
+        self.dupes += 1
+
+    def _backtrack(self, i, choices):
+        self.backtracks += 1
+        self.charge(1)
+
+    def _pike_step(self, depth):
+        self.pike_steps += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.charge(1)
+
+    def _pikevm_step(self, i, threads):
+        self.pikevm_steps += 1
+        if threads > self.peak_threads:
+            self.peak_threads = threads
+        self.charge(max(threads, 1))
+
+    def _dfa_step(self, i):
+        self.dfa_steps += 1
+        self.charge(1)
+
+    def _dfa_run(self, dfa, hits, misses):
+        self.cache_hits += hits
+        self.cache_misses += misses
+
+
+@contextlib.contextmanager
+def collect(stats=None, max_steps=None, timeout=None):
+    """Count the work done inside a with statement.
+
+    The with statement returns a new Stats for the code inside. If
+    stats is given, the counts are also added to it at the end, so one
+    Stats can total many calls. A tracer that is already attached
+    keeps seeing the events.
+
+    If max_steps or timeout (in seconds) is given, BudgetExceeded is
+    raised once the code inside has done that many steps or run that
+    long.
+    """
+    call = Stats()
+    old = tracing.current.get()
+    tracer = call
+    if old is not None:
+        def tracer(event, **fields):
+            call(event, **fields)
+            old(event, **fields)
+
+    start = time.perf_counter()
+    if max_steps is not None:
+        call._step_limit = max_steps
+    if timeout is not None:
+        call._deadline = start + timeout
+
+    token = tracing.current.set(tracer)
+    try:
+        yield call
+    finally:
+        tracing.current.reset(token)
+        call.time += time.perf_counter() - start
+        call.calls += 1
+        if stats is not None:
+            with _lock:
+                stats._add(call)
+
+
+def run(fn, *args, max_steps=None, timeout=None, **kwargs):
+    """Call fn and return its result and the Stats for the call.
+
+    If the result is a match, the Stats are also stored as its stats
+    attribute. max_steps and timeout work as for collect().
+    """
+    with collect(max_steps=max_steps, timeout=timeout) as stats:
+        if fn in (pike.match, pike.match_here):
+            result = _run_profiled(stats, fn, args, kwargs)
+        else:
+            result = fn(*args, **kwargs)
+    if hasattr(result, 'stats'):
+        result.stats = stats
+    return (result, stats)
+
+
+def _run_profiled(stats, fn, args, kwargs):
+    "Call one of the functions from the article, counting match_here()."
+    code = pike.match_here.__code__
+    depth = 0
+
+    def profile(frame, event, arg):
+        nonlocal depth
+        if frame.f_code is not code:
+            return
+        if event == 'call':
+            depth += 1
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+            stats.pike_steps += 1
+            # Python removes the profile function if this raises
+            # BudgetExceeded, and the exception unwinds the match.
+            stats.charge(1)
+        elif event == 'return':
+            depth -= 1
+
+    old = sys.getprofile()
+    sys.setprofile(profile)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sys.setprofile(old)
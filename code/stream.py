@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Find matches in input that arrives in pieces, such as a large file
+# read in chunks or data from a socket.
+#
+# The matcher runs the numbered states of a program.Program like the
+# Pike VM, but each thread only remembers where it started. Matches
+# are leftmost-longest and do not overlap, as with repeated calls to
+# search(). A match is reported as soon as no running thread could
+# replace it with a longer or further left one.
+#
+# The automaton state is bounded by the size of the pattern. The only
+# input kept is the text that may still be part of a match, starting
+# from the best candidate so far or the oldest running thread.
+
+import collections
+
+import nfa
+import program
+
+# A match found in a stream. start and end are offsets from the
+# beginning of the stream.
+StreamMatch = collections.namedtuple('StreamMatch', ['start', 'end', 'text'])
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamMatcher:
+    "Search for a pattern in input that is given a piece at a time."
+
+    def __init__(self, pattern):
+        self.prog = nfa.compile(pattern).program
+        # Input that has been fed but may still be needed, and the
+        # offset in the stream of its first character.
+        self.buffer = ''
+        self.base = 0
+        # The offset of the next character to process.
+        self.i = 0
+        self.threads = []
+        self.seen = set()
+        # The (start, end) of the best match found so far.
+        self.best = None
+
+    def feed(self, chunk):
+        """Process more input, returning the matches that are now final.
+
+        The chunks may be str or bytes-like, but all of the chunks in
+        one stream must be the same kind.
+        """
+        if not isinstance(chunk, (str, bytes)):
+            chunk = bytes(chunk)
+        if not self.buffer:
+            # Start with an empty str or bytes to match the input.
+            self.buffer = chunk[:0]
+        self.buffer += chunk
+        found = self._advance()
+        self._trim()
+        return found
+
+    def finish(self):
+        "Signal the end of the input, returning the remaining matches."
+        found = self._advance()
+        # No more input is coming, so any candidate is now final. After
+        # reporting it, scan again from its end for the next one.
+        while self.best is not None:
+            found.append(self._emit())
+            found.extend(self._advance())
+        self.buffer = ''
+        self.base = self.i
+        return found
+
+    def _advance(self):
+        "Run the threads over the buffered input."
+        prog = self.prog
+        op = prog.op
+        char = prog.char
+        out1 = prog.out1
+        found = []
+        end = self.base + len(self.buffer)
+
+        while self.i < end:
+            i = self.i
+            if self.best is None:
+                # Start a thread here, after the ones already running
+                # so a state reached from an earlier start wins.
+                self._add(self.threads, self.seen, prog.start, i)
+
+            code = self.buffer[i - self.base]
+            if isinstance(code, str):
+                code = ord(code)
+            nlist = []
+            self.seen = set()
+            for pc, start in self.threads:
+                if op[pc] == program.CHAR and char[pc] == code:
+                    self._add(nlist, self.seen, out1[pc], start)
+
+            best = self.best
+            self.threads = []
+            for thread in nlist:
+                pc, start = thread
+                if op[pc] == program.MATCH:
+                    if best is None or start <= best[0]:
+                        best = (start, i + 1)
+                elif best is None or start <= best[0]:
+                    self.threads.append(thread)
+            self.best = best
+            self.i = i + 1
+
+            if best is not None and not self.threads:
+                # Nothing can improve on the match, so report it and
+                # look for the next one starting where it ends.
+                found.append(self._emit())
+        return found
+
+    def _emit(self):
+        start, end = self.best
+        m = StreamMatch(
+            start, end,
+            self.buffer[start - self.base:end - self.base],
+        )
+        self.best = None
+        self.threads = []
+        self.seen = set()
+        self.i = end
+        return m
+
+    def _trim(self):
+        "Forget input that can no longer be part of a match."
+        # Keep the candidate, and the text a running thread might still
+        # match. A thread that started before the candidate can still
+        # replace it with a match further left.
+        starts = [start for pc, start in self.threads]
+        if self.best is not None:
+            starts.append(self.best[0])
+        keep = min(starts, default=self.i)
+        self.buffer = self.buffer[keep - self.base:]
+        self.base = keep
+
+    def _add(self, threads, seen, pc, start):
+        op = self.prog.op
+        out1 = self.prog.out1
+        out2 = self.prog.out2
+        todo = [pc]
+        while todo:
+            pc = todo.pop()
+            if pc in seen:
+                continue
+            seen.add(pc)
+            if op[pc] == program.SPLIT:
+                todo.append(out2[pc])
+                todo.append(out1[pc])
+            else:
+                threads.append((pc, start))
+
+
+def iter_matches(pattern, f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the file f in chunks and yield the matches in it.
+
+    Files opened in binary mode give matches with bytes text.
+    """
+    matcher = StreamMatcher(pattern)
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield from matcher.feed(chunk)
+    yield from matcher.finish()
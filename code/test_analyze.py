@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import analyze
+
+
+def _issues(pattern):
+    return [(i.severity, i.pos) for i in analyze.analyze(pattern).issues]
+
+
+def test_nested_quantifiers():
+    assert _issues('(a*)*b') == [(analyze.EXPONENTIAL, 4)]
+    assert _issues('(a+)+b') == [(analyze.EXPONENTIAL, 4)]
+    # Each repetition has to end with b, or start with b, so a run of
+    # a's can only be matched one way.
+    assert _issues('(a*b)*c') == []
+    assert _issues('(ba*)*') == []
+
+
+def test_ambiguous_alternation():
+    assert _issues('(a|aa)*b') == [(analyze.EXPONENTIAL, 6)]
+    assert _issues('(a|b)*c') == []
+    # Outside of a loop the alternatives are only tried once.
+    assert _issues('(a|aa)b') == []
+
+
+def test_adjacent_loops():
+    assert _issues('a*a*b') == [(analyze.POLYNOMIAL, 3)]
+    assert _issues('a*(a|b)*c') == [(analyze.POLYNOMIAL, 7)]
+    assert _issues('a*ba*') == []
+    # The loops meet through the optional b.
+    assert _issues('a*b?a*') == [(analyze.POLYNOMIAL, 5)]
+
+
+def test_state_counts():
+    a = analyze.analyze('a(bb)*a(c|d|e|fg)hij')
+    assert a.positions == 12
+    assert a.nfa_states > a.positions
+    assert a.dfa_states is not None
+    # The n-th character from the end needs 2**n DFA states.
+    a = analyze.analyze('(a|b)*a' + '(a|b)' * 10)
+    assert a.dfa_states is None
+    assert analyze.analyze('(a|b)*a' + '(a|b)' * 3).dfa_states == 16
+
+
+def test_recommend():
+    a = analyze.analyze('(a|aa)*b')
+    assert (a.kind, a.engine) == (analyze.DFA, 'bitparallel')
+    a = analyze.analyze('(' + 'abc|' * 30 + 'x)y')
+    assert (a.kind, a.engine) == (analyze.DFA, 'dfa')
+    a = analyze.analyze('(a|b)*a' + '(a|b)' * 10)
+    assert (a.kind, a.engine) == (analyze.THOMPSON, 'pikevm')
+    a = analyze.analyze('^ab.*c$')
+    assert (a.kind, a.engine) == (analyze.BACKTRACKING, 'pike-iterative')
+
+
+def test_check():
+    with pytest.raises(analyze.DangerousPattern):
+        analyze.check('(a*)*b')
+    assert not analyze.check('a*a*b').exponential
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import json
+
+import pytest
+
+import benchmark
+import matchers
+
+
+def test_percentile():
+    times = [5, 1, 4, 2, 3]
+    assert benchmark.percentile(times, 50) == 3
+    assert benchmark.percentile(times, 90) == 5
+    assert benchmark.percentile(times, 0) == 1
+
+
+def test_run_and_scaling():
+    case = benchmark.Case('tiny', lambda n: 'ab*c', lambda n: 'x' * n + 'abc',
+                          [10, 40])
+    engines = [e for e in matchers.ENGINES
+               if e.name in ('nfa', 'pike', 'recursive_descent')]
+    results = benchmark.run([case], engines, repeat=2)
+    assert [(r['engine'], r['length']) for r in results] == [
+        ('nfa', 13), ('nfa', 43),
+        ('pike', 13), ('pike', 43),
+        ('recursive_descent', 13), ('recursive_descent', 43),
+    ]
+    for r in results:
+        assert len(r['times']) == 2
+        assert r['p50'] <= r['p99']
+        assert r['peak_memory'] > 0
+    curves = benchmark.scaling(results)
+    assert [c['lengths'] for c in curves] == [[13, 43]] * 3
+
+
+def test_errors_are_recorded():
+    case = benchmark.Case('end', lambda n: 'ab', lambda n: 'xa', [2])
+    engines = [e for e in matchers.ENGINES if e.name == 'recursive_descent']
+    [result] = benchmark.run([case], engines)
+    assert result['error'].startswith('IndexError')
+
+
+def test_json_output(tmp_path, capsys):
+    path = tmp_path / 'out.json'
+    assert benchmark.main(['--json', str(path), '--repeat', '1',
+                           '--case', 'literal-no-match', '--engine', 'dfa',
+                           '--quick']) == 0
+    data = json.loads(path.read_text())
+    assert [r['length'] for r in data['results']] == [100, 1000]
+    assert 'p50' in capsys.readouterr().out
+
+
+def test_help(capsys):
+    with pytest.raises(SystemExit):
+        benchmark.main(['--help'])
+    assert 'Time every matcher' in capsys.readouterr().out
+
+
+def test_over_budget_is_recorded():
+    case = benchmark.Case('tiny', lambda n: 'ab*c', lambda n: 'x' * n,
+                          [10, 40])
+    engines = [e for e in matchers.ENGINES if e.name == 'nfa']
+    [result] = benchmark.run([case], engines, repeat=3, budget=0)
+    assert result['over_budget']
+    assert len(result['times']) == 1
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import bitparallel
+import nfa
+
+
+CASES = [
+    ('a', 'baab'),
+    ('ab*a', 'xxabbbaxaba'),
+    ('a(bb)*a(c|d|e|fg)hij', 'aabbafghij abbbbafghij'),
+    ('a((bc)|(bd))+', 'xxabcbdbd'),
+    ('a+a', 'baaaa'),
+    ('ab?c+.(first(second|third)+)', 'abc.firstsecondthird trailing'),
+    ('(a|b)*abb', 'babababb'),
+    ('abc', 'ababababa'),
+    ('a*', 'bbb'),
+]
+
+
+def _bitparallel(pattern):
+    return bitparallel.BitParallel(
+        bitparallel.from_postfix(nfa.compile(pattern).postfix))
+
+
+def test_positions():
+    g = bitparallel.from_postfix(nfa.compile('a(b|c)*d').postfix)
+    assert g.chars == ['a', 'b', 'c', 'd']
+    assert g.first == 0b0001
+    assert g.last == 0b1000
+    assert g.follow == [0b1110, 0b1110, 0b1110, 0]
+
+
+def test_same_results_as_nfa():
+    for pattern, text in CASES:
+        bp = _bitparallel(pattern)
+        p = nfa.compile(pattern)
+        for start in range(len(text)):
+            m = nfa._match(p.nfa, text, start)
+            assert bp.match_end(text, start) == (m.extents[0][1] if m else -1)
+
+
+def test_more_than_one_table():
+    pattern = 'x' + 'ab' * 20 + '(c|d)*y'
+    bp = _bitparallel(pattern)
+    assert len(bp.tables) == 6
+    text = 'zx' + 'ab' * 20 + 'cdcy'
+    assert bp.search_end(text, 0) == len(text)
+    assert bp.match_end(text, 1) == len(text)
+
+
+def test_auto_engine():
+    assert nfa.compile('a(b|c)*d', engine='auto').engine == 'bitparallel'
+    assert nfa.compile('a' * 65, engine='auto').engine == 'dfa'
+    p = nfa.compile('a(bb)*a(c|d|e|fg)hij', engine='auto')
+    expected = nfa.compile('a(bb)*a(c|d|e|fg)hij').search('xx abbafghij')
+    found = p.search('xx abbafghij')
+    assert found.text == expected.text
+    assert found.extents == expected.extents
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import json
+
+import pytest
+
+import compare
+
+
+def test_mann_whitney():
+    old = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02, 0.98, 1.01]
+    slower = [v * 2 for v in old]
+    u, p = compare.mann_whitney(old, slower)
+    assert u == len(old) * len(slower)
+    assert p < 0.001
+    u, p = compare.mann_whitney(old, old)
+    assert p > 0.4
+    assert compare.mann_whitney([1, 1, 1], [1, 1]) == (3.0, 1.0)
+    with pytest.raises(ValueError):
+        compare.mann_whitney([], [1])
+
+
+def _result(engine, times, length=10):
+    return {'case': 'c', 'engine': engine, 'length': length,
+            'times': times}
+
+
+def test_compare():
+    base = [0.010, 0.011, 0.009, 0.0105, 0.0095, 0.0102, 0.0098, 0.0101]
+    old = [_result('same', base), _result('slower', base),
+           _result('noisy', base), _result('broken', base),
+           _result('gone', base), _result('stuck', base)]
+    noisy = list(base)
+    noisy[0] = 1.0
+    new = [_result('same', base),
+           _result('slower', [t * 1.5 for t in base]),
+           _result('noisy', noisy),
+           dict(_result('broken', []), error='RecursionError: deep'),
+           dict(_result('stuck', [2.0]), over_budget=True)]
+    rows = {row['engine']: row for row in compare.compare(old, new)}
+    assert not rows['same']['regressed']
+    assert rows['slower']['regressed']
+    assert rows['slower']['change'] == pytest.approx(0.5)
+    # One slow outlier does not move the median or the ranks much.
+    assert not rows['noisy']['regressed']
+    assert rows['broken']['regressed']
+    assert rows['broken']['status'] == 'RecursionError: deep'
+    assert rows['gone']['status'] == 'missing'
+    assert rows['gone']['regressed']
+    assert rows['stuck']['status'] == 'over budget'
+    assert rows['stuck']['regressed']
+
+
+def test_diff_exit_status(tmp_path, capsys):
+    base = [0.010 + i * 0.0001 for i in range(10)]
+    old = tmp_path / 'old.json'
+    new = tmp_path / 'new.json'
+    old.write_text(json.dumps({'results': [_result('e', base)]}))
+    new.write_text(json.dumps({'results': [_result('e', base)]}))
+    assert compare.main(['diff', str(old), str(new)]) == 0
+    new.write_text(json.dumps(
+        {'results': [_result('e', [t * 1.2 for t in base])]}))
+    assert compare.main(['diff', str(old), str(new)]) == 1
+    assert compare.main(['diff', str(old), str(new),
+                         '--threshold', '0.5']) == 0
+    assert 'SLOWER' in capsys.readouterr().out
+
+
+def test_save_and_check(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    assert compare.main(['save', str(baseline), '--repeat', '3',
+                         '--case', 'literal-no-match',
+                         '--engine', 'dfa']) == 0
+    saved = json.loads(baseline.read_text())['results']
+    rerun = compare.rerun(saved, repeat=3)
+    assert [(r['engine'], r['length']) for r in rerun] == [
+        (r['engine'], r['length']) for r in saved]
+
+
+def test_rerun_has_no_budget(monkeypatch):
+    calls = []
+    monkeypatch.setattr(compare.benchmark, 'run',
+                        lambda *args: calls.append(args) or [])
+    compare.rerun([dict(_result('dfa', [1.0], length=100),
+                        case='literal-no-match')], repeat=3)
+    [(cases, engines, repeat, budget)] = calls
+    assert budget == float('inf')
+    assert [e.name for e in engines] == ['dfa']
+
+
+def test_rerun_only_baseline_cells(monkeypatch):
+    calls = []
+    monkeypatch.setattr(compare.benchmark, 'run',
+                        lambda *args: calls.append(args) or [])
+    # The nfa engine stopped early in the baseline and pikevm did not.
+    old = [dict(_result(engine, [1.0], length=length),
+                case='alternation-star')
+           for engine, length in [('nfa', 10), ('nfa', 20),
+                                  ('pikevm', 10), ('pikevm', 20),
+                                  ('pikevm', 40), ('pikevm', 80)]]
+    compare.rerun(old, repeat=3)
+    ran = {(engines[0].name, len(cases[0].text(n)))
+           for cases, engines, repeat, budget in calls
+           for n in cases[0].lengths}
+    assert ran == {(r['engine'], r['length']) for r in old}
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import io
+
+import pytest
+
+import dfa
+import nfa
+
+
+CASES = [
+    ('a', 'baab'),
+    ('ab*a', 'xxabbbaxaba'),
+    ('a(bb)*a(c|d|e|fg)hij', 'aabbafghij abbbbafghij'),
+    ('a((bc)|(bd))+', 'xxabcbdbd'),
+    ('a+a', 'baaaa'),
+    ('abc', 'ababababa'),
+    ('a*', 'bbb'),
+]
+
+
+def _nfa_match_end(pattern, text, start):
+    m = nfa._match(nfa.compile(pattern).nfa, text, start)
+    return m.extents[0][1] if m else -1
+
+
+def test_same_results_as_nfa():
+    for pattern, text in CASES:
+        anchored = dfa.from_pattern(pattern)
+        for start in range(len(text)):
+            assert (anchored.match_end(text, start) ==
+                    _nfa_match_end(pattern, text, start))
+
+        unanchored = dfa.from_pattern(pattern, unanchored=True)
+        m = nfa.match(pattern, text)
+        if m is None:
+            assert unanchored.search_end(text, 0) == -1
+        else:
+            assert unanchored.search_end(text, 0) > 0
+
+
+def test_minimized():
+    # The textbook example needs 4 states plus the dead state.
+    d = dfa.from_pattern('(a|b)*abb')
+    assert d.nstates == 5
+    assert d.match_end('babb', 0) == 4
+    assert d.match_end('abab', 0) == -1
+
+
+def test_save_and_load():
+    d = dfa.from_pattern('a(bb)*a(c|d|e|fg)hij', unanchored=True)
+    buf = io.BytesIO()
+    d.save(buf)
+    buf.seek(0)
+    loaded = dfa.DFA.load(buf)
+    assert loaded.table == d.table
+    assert loaded.accept == d.accept
+    assert loaded.classes == d.classes
+    assert loaded.search_end('xx abbbbafghij', 0) == 14
+
+
+def test_too_many_states():
+    with pytest.raises(dfa.TooManyStates):
+        dfa.from_pattern('(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)',
+                         unanchored=True, max_states=20)
+
+
+def test_bytes_input():
+    d = dfa.from_pattern('ab*a')
+    assert d.match_end(b'abbax', 0) == 4
+    assert d.match_end(bytearray(b'xaba'), 1) == 4
+    assert d.match_end(memoryview(b'abbbc'), 0) == -1
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import lazydfa
+import nfa
+import program
+
+
+CASES = [
+    ('a', 'baab'),
+    ('ab*a', 'xxabbbaxaba'),
+    ('a(bb)*a(c|d|e|fg)hij', 'aabbafghij abbbbafghij'),
+    ('a((bc)|(bd))+', 'xxabcbdbd'),
+    ('a+a', 'baaaa'),
+    ('(a|b)c', 'aabbc'),
+    ('abc', 'ababababa'),
+    ('a*', 'bbb'),
+    ('abcd|c', 'xxabcd'),
+    ('(a|b)*c', 'ab' * 50 + 'xc'),
+]
+
+
+def test_same_span_as_nfa():
+    for pattern, text in CASES:
+        expected = nfa.compile(pattern).search(text)
+        found = nfa.compile(pattern, engine='dfa').search(
+            text, captures=False)
+        if expected is None:
+            assert found is None
+        else:
+            assert found.extents[0] == expected.extents[0]
+            assert found.text[0] == expected.text[0]
+
+
+def test_captures_fall_back_to_nfa():
+    p = nfa.compile('a((b)(c))', engine='dfa')
+    m = p.search('xxabc')
+    assert m.extents == {
+        0: (2, 5),
+        1: (3, 5),
+        2: (3, 4),
+        3: (4, 5),
+    }
+    assert p.search('xxacb') is None
+
+
+def test_match_and_fullmatch():
+    p = nfa.compile('ab*', engine='dfa')
+    assert p.match('abbc', captures=False).extents == {0: (0, 3)}
+    assert p.match('cabb', captures=False) is None
+    assert p.fullmatch('abbc', captures=False) is None
+    assert p.fullmatch('abb', captures=False).text == {0: 'abb'}
+
+
+def test_transitions_are_cached():
+    p = nfa.compile('(a|b)*c')
+    dfa = lazydfa.LazyDFA(p.program)
+    assert dfa.match_end('ababc', 0) == 5
+    misses = dfa.misses
+    assert dfa.match_end('ababc', 0) == 5
+    assert dfa.misses == misses
+    assert dfa.hits >= 5
+
+
+def test_cache_flushed_at_limit():
+    p = nfa.compile('(a|b)*abb')
+    dfa = lazydfa.LazyDFA(p.program, unanchored=True, max_states=2)
+    assert dfa.search_end('babaabaabb', 0) == 10
+    assert dfa.flushes > 0
+    assert len(dfa.cache) <= 3
+
+
+def test_bytes_input():
+    d = lazydfa.LazyDFA(nfa.compile('ab*a').program, unanchored=True)
+    assert d.search_end(b'xxabba', 0) == 6
+    # Text and bytes share the cached transitions.
+    assert d.search_end('xxabba', 0) == 6
+    assert d.hits >= 6
+
+
+def test_leftmost_end():
+    d = lazydfa.LeftmostDFA(nfa.compile('abcd|c').program)
+    # The first match to finish is 'c', but 'abcd' starts earlier.
+    assert d.leftmost_end('xxabcd', 0) == 6
+    assert d.leftmost_end('xxabcd', 3) == 5
+    assert d.leftmost_end('xxabd', 0) == -1
+
+
+def test_match_start():
+    d = lazydfa.LazyDFA(program.from_pattern('(a|b)*c', reverse=True))
+    assert d.match_start('xxababc', 7) == 2
+    assert d.match_start('xxababc', 7, 4) == 4
+    assert d.match_start('xxababd', 7) == -1
+
+
+def test_span_is_linear():
+    p = nfa.compile('(a|b)*c', engine='dfa')
+    text = 'ab' * 4000 + 'xc'
+    before = [(d.hits + d.misses) for d in (p.leftmost_dfa, p.reverse_dfa)]
+    assert p.search(text, captures=False).extents == {0: (8001, 8002)}
+    # Each of the scans that finds the span reads a character at most
+    # once.
+    after = [(d.hits + d.misses) for d in (p.leftmost_dfa, p.reverse_dfa)]
+    assert after[0] - before[0] <= len(text)
+    assert after[1] - before[1] <= len(text)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import matchers
+
+
+def test_supports():
+    engines = {e.name: e for e in matchers.ENGINES}
+    assert matchers.supports(engines['nfa'], 'a+b?')
+    assert not matchers.supports(engines['pike'], 'a+b?')
+    assert matchers.supports(engines['pike'], '^a*b$')
+    assert not matchers.supports(engines['recursive_descent'], '(a*)*b')
+    assert matchers.supports(engines['rd-compiled'], '(a*)*b')
+
+
+def test_by_name():
+    assert matchers.by_name('pikevm').name == 'pikevm'
+    assert matchers.by_name('pike').syntax == matchers.PIKE_SYNTAX
+    with pytest.raises(ValueError):
+        matchers.by_name('bogus')
+
+
+def test_every_engine_finds_the_match():
+    for engine in matchers.ENGINES:
+        search = engine.factory('ab*c')
+        assert search('xabbc')
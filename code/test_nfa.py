@@ -2,6 +2,8 @@
 
 import pprint
 
+import nfa
+import tracing
 from nfa import _check
 
 
@@ -118,3 +120,165 @@ def test_complex_with_trailing():
         r'abc.firstsecondthird trailing',
         r'abc.firstsecondthird',
     )
+
+def test_compile_reuses_pattern():
+    nfa.purge()
+    p1 = nfa.compile('a(b|c)')
+    p2 = nfa.compile('a(b|c)')
+    assert p1 is p2
+    info = nfa.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.currsize == 1
+
+def test_cache_evicts_least_recently_used():
+    nfa.purge()
+    nfa.set_cache_size(2)
+    try:
+        a = nfa.compile('a')
+        nfa.compile('b')
+        nfa.compile('a')
+        nfa.compile('c')
+        assert nfa.cache_info().currsize == 2
+        # 'b' was the oldest entry, so 'a' should survive.
+        assert nfa.compile('a') is a
+    finally:
+        nfa.set_cache_size(nfa.DEFAULT_CACHE_SIZE)
+        nfa.purge()
+
+def test_pattern_match_search_fullmatch():
+    p = nfa.compile('ab+')
+    assert p.match('xabb') is None
+    assert p.match('abbx').text[0] == 'abb'
+    assert p.search('xabbx').extents == {0: (1, 4)}
+    assert p.fullmatch('abbx') is None
+    assert p.fullmatch('abb').text[0] == 'abb'
+
+def test_bytes_input_all_engines():
+    pattern = 'a(bb)*a(c|d|e|fg)hij'
+    text = 'xx abbbbafghij'
+    expected = nfa.compile(pattern).search(text)
+    for engine in nfa.ENGINES:
+        p = nfa.compile(pattern, engine=engine)
+        for data in (text.encode('ascii'), bytearray(text, 'ascii'),
+                     memoryview(text.encode('ascii'))):
+            m = p.search(data)
+            assert m.extents == expected.extents
+            assert m.text == {
+                k: v.encode('ascii') for k, v in expected.text.items()
+            }
+            assert p.search(data, captures=False).text[0] == b'abbbbafghij'
+        assert p.match(b'abbafghij').text[0] == b'abbafghij'
+        assert p.search(b'abbafgh') is None
+
+def test_finditer_resumes_after_match():
+    for engine in nfa.ENGINES:
+        p = nfa.compile('a(b|c)+', engine=engine)
+        found = p.finditer('xabcab ac abb')
+        assert next(found).extents == {0: (1, 4), 1: (2, 4)}
+        assert [m.text[1] for m in found] == ['b', 'c', 'bb']
+        assert p.findall('xabcab ac abb') == ['abc', 'ab', 'ac', 'abb']
+        assert p.findall(b'ab') == [b'ab']
+        assert p.findall('xyz') == []
+
+def test_search_from_pos():
+    for engine in nfa.ENGINES:
+        p = nfa.compile('ab', engine=engine)
+        assert p.search('abxab', pos=1).extents[0] == (3, 5)
+        assert p.search('abxab', pos=4) is None
+
+def test_split():
+    p = nfa.compile(',+')
+    assert p.split('a,b,,c') == ['a', 'b', 'c']
+    assert p.split(',a,') == ['', 'a', '']
+    assert p.split('a,b,,c', maxsplit=1) == ['a', 'b,,c']
+    assert p.split(memoryview(b'a,b')) == [b'a', b'b']
+
+def test_sub():
+    p = nfa.compile('a(b*)')
+    assert p.sub('-', 'xabbyaz') == 'x-y-z'
+    assert p.sub('-', 'xabbyaz', count=1) == 'x-yaz'
+    assert p.sub(lambda m: m.text.get(1, '?').upper(), 'xabbyaz') == 'xBBy?z'
+    assert p.sub(b'-', b'ab ab') == b'- -'
+
+def test_mmap_input(tmp_path):
+    import mmap
+    path = tmp_path / 'input'
+    path.write_bytes(b'x' * 10000 + b'abbafghij')
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for engine in nfa.ENGINES:
+                p = nfa.compile('a(bb)*a(c|d|e|fg)hij', engine=engine)
+                m = p.search(data)
+                assert m.extents[0] == (10000, 10009)
+                assert m.text[2] == b'fg'
+
+def test_bytes_cannot_match_wide_characters():
+    assert nfa.compile('\u20ac').search('\u20ac'.encode('utf-8')) is None
+
+def test_search_single_pass_matches_restarting():
+    cases = [
+        ('a', 'baab'),
+        ('ab*a', 'xxabbbaxaba'),
+        ('a(bb)*a(c|d|e|fg)hij', 'aabbafghij abbbbafghij'),
+        ('a((bc)|(bd))+', 'xxabcbdbd'),
+        ('a+a', 'baaaa'),
+        ('(a|b)c', 'aabbc'),
+        ('abc', 'ababababa'),
+    ]
+    for pattern, text in cases:
+        p = nfa.compile(pattern)
+        expected = None
+        for start in range(len(text)):
+            expected = nfa._match(p.nfa, text, start)
+            if expected:
+                break
+        found = p.search(text)
+        if expected is None:
+            assert found is None
+        else:
+            assert found.text == expected.text
+            assert found.extents == expected.extents
+
+def test_dedupe_same_results():
+    cases = [
+        ('a(a|(b|c))+', 'aabd'),
+        ('a((b)(c))', 'xabc'),
+        ('a(bb)*a(c|d|e|fg)hij', 'abbbbafghij trailing'),
+        ('a((bc)|(bd))+', 'abdbc'),
+        ('ab?c+.(first(second|third)+)', 'abc.firstsecondthird trailing'),
+        ('a+a', 'aaaa'),
+    ]
+    for pattern, text in cases:
+        expected = nfa.compile(pattern).search(text)
+        found = nfa.compile(pattern, dedupe=True).search(text)
+        assert found.text == expected.text
+        assert found.extents == expected.extents
+
+def test_dedupe_bounds_paths():
+    # Without deduplication the number of paths doubles with every
+    # character consumed.
+    p = nfa.compile('(a|a)*b', dedupe=True)
+    m = p.search('a' * 200 + 'b')
+    assert m.extents[0] == (0, 201)
+    assert p.match('a' * 200) is None
+
+def test_ties_prefer_first_alternative():
+    m = nfa.compile('(a)|(a)').search('a')
+    assert m.text == {0: 'a', 1: 'a'}
+
+def test_tracer_sees_steps():
+    recorder = tracing.Recorder()
+    with tracing.attached(recorder):
+        nfa.match('ab', 'xab')
+    names = recorder.names()
+    assert 'nfa.step' in names
+    assert 'nfa.found' in names
+    assert tracing.current.get() is None
+
+def test_logging_tracer_formats_events():
+    lines = []
+    with tracing.attached(tracing.LoggingTracer(lines.append)):
+        nfa.match('a(b|c)', 'ac')
+    assert '\nsearch checking {!r}'.format('ac') in lines
+    assert any(line.startswith('next_paths') for line in lines)
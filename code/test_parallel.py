@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import pickle
+
+import nfa
+import parallel
+
+PATTERN = 'a(bb)*a(c|d|e|fg)hij'
+
+LINES = [
+    'aafghij',
+    'nothing here',
+    'xx abbbbachij',
+    '',
+    b'abbaehij',
+    'abbbafghij',
+] * 7
+
+
+def _expected(line):
+    m = nfa.compile(PATTERN).search(line)
+    return m and (m.text, m.extents)
+
+
+def _summary(m):
+    return m and (m.text, m.extents)
+
+
+def test_in_order():
+    found = parallel.match_many(PATTERN, LINES, workers=2, batch_size=4)
+    assert [_summary(m) for m in found] == [_expected(s) for s in LINES]
+
+
+def test_as_completed():
+    found = parallel.match_many(PATTERN, iter(LINES), workers=2,
+                                batch_size=3, ordered=False)
+    results = dict(found)
+    assert sorted(results) == list(range(len(LINES)))
+    for i, line in enumerate(LINES):
+        assert _summary(results[i]) == _expected(line)
+
+
+def test_worker_state_pickles():
+    p = nfa.compile(PATTERN)
+    prog, prefilter = pickle.loads(pickle.dumps((p.program, p.prefilter)))
+    m = parallel._Matcher(prog, prefilter).search('xx abbbbachij')
+    assert _summary(m) == _expected('xx abbbbachij')
+
+
+CHUNKED_CASES = [
+    ('a', 'bbbbbbbbbaab'),
+    ('ab*a', 'xxabbbaxaba'),
+    ('a(bb)*a(c|d|e|fg)hij', 'aabbafghij abbbbafghij'),
+    ('abcd|c', 'xxxxxxabcd'),
+    ('abc', 'ababababa'),
+    ('x(ab)*y', 'xababababababababy'),
+    ('(a|b)*c', 'ab' * 50 + 'xc'),
+    ('abc', 'xxxx'),
+]
+
+
+def _search_span(pattern, text):
+    m = nfa.compile(pattern).search(text)
+    return m and m.extents[0]
+
+
+def test_summary_from_every_state():
+    pattern, text = 'ab*a', 'xxabbbaxaba'
+    d = parallel.dfa.from_pattern(pattern, unanchored=True)
+    for n in (1, 2, 3, 5, len(text)):
+        summaries = [
+            parallel._summarize(d, text, lo, hi, 0)
+            for lo, hi in parallel._bounds(len(text), n)
+        ]
+        assert parallel._join(d, summaries) == d.search_end(text, 0)
+
+
+def test_reverse_summary_from_every_state():
+    for pattern, text in CHUNKED_CASES:
+        d = parallel.dfa.from_pattern(pattern, unanchored=True,
+                                      reverse=True)
+        expected = _search_span(pattern, text)
+        for n in (1, 2, 3, 5, len(text)):
+            summaries = [
+                parallel._summarize_reverse(d, text, lo, hi, 0)
+                for lo, hi in parallel._bounds(len(text), n)
+            ]
+            start = parallel._join_reverse(d, summaries)
+            assert start == (expected[0] if expected else -1)
+
+
+def test_chunked_search_end():
+    for pattern, text in CHUNKED_CASES:
+        d = parallel.dfa.from_pattern(pattern, unanchored=True)
+        expected = d.search_end(text, 0)
+        assert parallel.chunked_search_end(pattern, text, workers=3) == \
+            expected
+        assert parallel.chunked_search_end(
+            pattern, text.encode('ascii'), workers=2) == expected
+
+
+def test_chunked_search():
+    for pattern, text in CHUNKED_CASES:
+        expected = _search_span(pattern, text)
+        assert parallel.chunked_search(pattern, text, workers=3) == expected
+        assert parallel.chunked_search(
+            pattern, memoryview(text.encode('ascii')), workers=2) == expected
+
+
+def test_chunked_search_file(tmp_path):
+    path = tmp_path / 'input'
+    text = 'b' * 5000 + 'abbafghij' + 'b' * 5000
+    path.write_text(text)
+    pattern = 'a(bb)*a(c|d|e|fg)hij'
+    assert (parallel.chunked_search_file(pattern, path, workers=4) ==
+            (5000, 5009))
+    path.write_text('b' * 100)
+    assert parallel.chunked_search_file(pattern, path, workers=4) is None
+    path.write_text('')
+    assert parallel.chunked_search_file(pattern, path, workers=4) is None
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import nfa
+import patternset
+import program
+
+
+PATTERNS = [
+    'ERROR(a|b)*',
+    'disk (full|error)',
+    'a+b',
+    'xyz',
+]
+
+
+def _expected(text):
+    return [
+        i for i, p in enumerate(PATTERNS)
+        if nfa.match(p, text) is not None
+    ]
+
+
+def test_union_tags_match_states():
+    prog = program.union([program.from_pattern(p) for p in PATTERNS])
+    tags = sorted(
+        prog.char[pc] for pc in range(len(prog))
+        if prog.op[pc] == program.MATCH
+    )
+    assert tags == [0, 1, 2, 3]
+
+
+def test_same_as_separate_matches():
+    texts = [
+        'ERRORab on disk error',
+        'nothing here',
+        'aaab xyz',
+        'disk ful',
+        '',
+    ]
+    for use_dfa in (True, False):
+        ps = patternset.PatternSet(PATTERNS, use_dfa=use_dfa)
+        for text in texts:
+            assert ps.matches(text) == _expected(text)
+
+
+def test_search_returns_groups():
+    ps = patternset.PatternSet(PATTERNS)
+    found = ps.search('aab: disk full')
+    assert sorted(found) == [1, 2]
+    assert found[1].text == {0: 'disk full', 1: 'full'}
+    assert found[2].extents == {0: (0, 3)}
+
+
+def test_single_pattern():
+    ps = patternset.PatternSet(['abc'])
+    assert ps.matches('xxabcxx') == [0]
+    assert ps.matches('xxabxx') == []
+
+
+def test_bytes_input():
+    for use_dfa in (True, False):
+        ps = patternset.PatternSet(['ab', 'bc', 'xyz'], use_dfa=use_dfa)
+        assert ps.matches(b'abc') == [0, 1]
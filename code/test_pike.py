@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from pike import match
+from pike import match, match_bytes, match_iterative
 
 
 def test_simple():
@@ -23,3 +23,24 @@ def test_anchor():
     assert match('^a*b$', 'aab')
     assert not match('^a*b$', 'caab')
     assert not match('^a*b$', 'aabc')
+
+
+def test_bytes():
+    assert match_bytes('a*b', b'xaab')
+    assert match_bytes('^a*b$', bytearray(b'aab'))
+    assert not match_bytes('^a*b$', b'aabc')
+    assert match_bytes('a.c', memoryview(b'xxabc'))
+    assert not match_bytes('a*b', b'')
+
+
+def test_iterative():
+    for regexp, text in [('a*b', 'xaab'), ('^a*b$', 'aab'),
+                         ('^a*b$', 'aabc'), ('a.c', 'xxabc'),
+                         ('a*b', 'c'), ('^$', 'x'), ('b$', 'ab')]:
+        assert match_iterative(regexp, text) == match(regexp, text)
+
+
+def test_iterative_long_input():
+    text = 'a' * 20000 + 'b'
+    assert match_iterative('^a*ab$', text)
+    assert not match_iterative('a*a*a*a*c', text[:2000])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import nfa
+import tracing
+
+
+CASES = [
+    ('a(a|(b|c))+', 'aabd'),
+    ('a((b)(c))', 'xabc'),
+    ('a(bb)*a(c|d|e|fg)hij', 'abbbbafghij trailing'),
+    ('a((bc)|(bd))+', 'abdbc'),
+    ('ab?c+.(first(second|third)+)', 'abc.firstsecondthird trailing'),
+    ('a+a', 'aaaa'),
+    ('((a)b)*', 'xabab'),
+    ('a(b)*(b)', 'abbb'),
+    ('(a|ab)(c|bcd)(d*)', 'abcd'),
+    ('ab*a', 'ada'),
+]
+
+
+def _same(pattern, text):
+    expected = nfa.compile(pattern).search(text)
+    found = nfa.compile(pattern, engine='pikevm').search(text)
+    if expected is None:
+        assert found is None
+    else:
+        assert found.text == expected.text
+        assert found.extents == expected.extents
+
+
+def test_same_groups_as_paths():
+    for pattern, text in CASES:
+        _same(pattern, text)
+
+
+def test_anchored():
+    p = nfa.compile('a(b|c)', engine='pikevm')
+    assert p.match('xab') is None
+    m = p.match('acx')
+    assert m.text == {0: 'ac', 1: 'c'}
+    assert m.extents == {0: (0, 2), 1: (1, 2)}
+
+
+def test_long_input():
+    # The Path chain for this input would be too deep to walk
+    # recursively.
+    text = 'x' + 'a' * 5000 + 'b'
+    m = nfa.compile('(a)*b', engine='pikevm').search(text)
+    assert m.extents == {0: (1, 5002), 1: (1, 5001)}
+
+
+def test_dfa_engine_uses_vm_for_groups():
+    m = nfa.compile('a(bb)*a(c|d|e|fg)hij', engine='dfa').search(
+        'xx abbbbafghij')
+    assert m.text == {0: 'abbbbafghij', 1: 'bbbb', 2: 'fg'}
+
+
+def test_group_text_skips_other_characters():
+    # Group 2 takes part in both repetitions, with a 'b' in between
+    # that belongs to group 1 only.
+    p = nfa.compile('((a)b)+', engine='pikevm')
+    m = p.search('xabab')
+    assert m.text == {0: 'abab', 1: 'abab', 2: 'aa'}
+    assert m.extents == {0: (1, 5), 1: (1, 5), 2: (1, 4)}
+    m = p.search(b'xabab')
+    assert m.text == {0: b'abab', 1: b'abab', 2: b'aa'}
+
+
+def test_match_is_traced():
+    recorder = tracing.Recorder()
+    with tracing.attached(recorder):
+        nfa.compile('ab*', engine='pikevm').search('xabb')
+    matches = [f for e, f in recorder.events if e == 'pikevm.match']
+    assert matches == [{'i': 1, 'start': 1}, {'i': 2, 'start': 1},
+                       {'i': 3, 'start': 1}]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import nfa
+import prefilter
+
+
+def _literals(pattern):
+    return prefilter.literals(nfa.postfix(nfa.tokenize(pattern)))
+
+
+def test_prefix_and_factor():
+    found = _literals('ERROR(a|b)*')
+    assert found.prefix == 'ERROR'
+    assert found.factor == 'ERROR'
+
+
+def test_factor_in_middle():
+    found = _literals('(a|b)*disk (full|error)')
+    assert found.prefix == ''
+    assert found.factor == 'disk '
+
+
+def test_common_text_in_alternatives():
+    found = _literals('(abcx|abcy)z')
+    assert found.prefix == 'abc'
+    assert found.suffix == 'z'
+
+
+def test_optional_text_is_not_required():
+    found = _literals('a(bcd)?e')
+    assert found.factor == 'a'
+    assert found.prefix == 'a'
+    assert _literals('(ab)+c').factor == 'abc'
+
+
+def test_no_literals():
+    assert prefilter.Prefilter.from_postfix(
+        nfa.postfix(nfa.tokenize('a*'))) is None
+
+
+def test_search_skips_offsets():
+    text = 'x' * 100 + 'ERRORabba' + 'y' * 20 + 'ERRORb'
+    for engine in nfa.ENGINES:
+        p = nfa.Pattern('ERROR(a|b)*', engine=engine)
+        m = p.search(text)
+        assert m.extents[0] == (100, 109)
+        assert p.prefilter.skipped >= 100
+
+
+def test_factor_rejects():
+    p = nfa.Pattern('(a|b)*disk (full|error)')
+    assert p.search('ababab disk') is None
+    assert p.prefilter.skipped == len('ababab disk')
+    assert p.search('abdisk error').text[0] == 'abdisk error'
+
+
+def test_match_needs_prefix():
+    p = nfa.Pattern('ab*')
+    assert p.match('xab') is None
+    assert p.match('abbx').text[0] == 'abb'
+
+
+def test_bytes_input():
+    p = nfa.compile('xy(a|b)+z')
+    assert p.prefilter.rejects(b'abababz')
+    assert not p.prefilter.rejects(b'xyaz')
+    assert p.prefilter.can_start(memoryview(b'xyaz'), 0)
+    assert p.search(b'...xyabz').extents[0] == (3, 8)
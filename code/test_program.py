@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import pickle
+
+import program
+
+
+def test_states_numbered_from_start():
+    prog = program.from_pattern('ab')
+    assert len(prog) == 3
+    assert prog.start == 0
+    assert list(prog.op) == [program.CHAR, program.CHAR, program.MATCH]
+    assert [chr(c) for c in prog.char[:2]] == ['a', 'b']
+    assert list(prog.out1) == [1, 2, program.NONE]
+
+
+def test_group_masks():
+    prog = program.from_pattern('a(b(c))')
+    chars = {
+        chr(prog.char[pc]): prog.group_numbers(pc)
+        for pc in range(len(prog))
+        if prog.op[pc] == program.CHAR
+    }
+    assert chars == {'a': [0], 'b': [0, 1], 'c': [0, 1, 2]}
+    assert prog.ngroups == 3
+
+
+def test_closure_skips_splits():
+    prog = program.from_pattern('a*b')
+    reached = prog.closure([prog.start])
+    assert sorted(chr(prog.char[pc]) for pc in reached) == ['a', 'b']
+
+
+def test_pickle():
+    prog = program.from_pattern('a(b|c)*d')
+    copy = pickle.loads(pickle.dumps(prog))
+    assert copy.op == prog.op
+    assert copy.out2 == prog.out2
+    assert copy.groups == prog.groups
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
-from recursive_descent import parse
+import pytest
+
+import tracing
+from recursive_descent import (Backtracker, Repetition, compile, parse,
+                               parse_iterative)
 
 
 def _check(expr, text, expected):
@@ -80,3 +84,157 @@ def test_nested_group():
         1: (1, 3),
         2: (2, 3),
     }
+
+
+def test_tracer_sees_matches():
+    recorder = tracing.Recorder()
+    with tracing.attached(recorder):
+        _check('a(b|c)', 'xac', 'ac')
+    assert 'rd.match' in recorder.names()
+    assert 'rd.add' in recorder.names()
+
+
+def test_bytes():
+    regex = parse('a(bb)*a(c|d|e|fg)hij')
+    match = regex.match_bytes(b'abbbbafghij trailing')
+    assert match.text == {
+        0: b'abbbbafghij',
+        1: b'bbbb',
+        2: b'fg',
+    }
+    assert match.extents[0] == (0, 11)
+
+
+def test_memo_same_as_match():
+    cases = [
+        ('a', 'baab'),
+        ('a*b', 'xaab'),
+        ('a(bb)*a(c|d|e|fg)hij', 'abbbbafghij trailing'),
+        ('a(bb)*a(c|d|e|fg)hij', 'aafghij trailing'),
+        ('(a|ab)(c|bcd)(d*)', 'abcdx'),
+        ('a((b)c)', 'xabc'),
+        ('((a)b)*c', 'xababc'),
+    ]
+    for expr, text in cases:
+        regex = parse(expr)
+        expected = regex.match(text)
+        found = regex.memo_match(text)
+        assert found.text == expected.text
+        assert found.extents == expected.extents
+
+
+def test_memo_bounded():
+    regex = parse('(a|b|c)*(aa|ab|ac)*d')
+    text = 'abc' * 50
+    memo = {}
+    assert regex.memo_match(text) is None
+    for start in range(len(text)):
+        regex._memo_match(text, start, memo)
+    nodes = len({node for node, start in memo})
+    assert len(memo) <= nodes * (len(text) + 1)
+
+
+def test_memo_repetition_reused():
+    regex = parse('(a|b)*c')
+    text = 'ab' * 20 + 'x'
+    memo = {}
+    regex._memo_match(text, 0, memo)
+    # Working out the repetition from the start also works it out
+    # from every position it passes, so later starts find it cached.
+    [repetition] = {node for node, start in memo
+                    if isinstance(node, Repetition)}
+    assert all((repetition, i) in memo for i in range(len(text) - 1))
+    assert regex.memo_match(text) is None
+
+
+def test_memo_long_input():
+    text = 'ab' * 5000 + 'c'
+    found = parse('((a)b)*c').memo_match(text)
+    assert found.extents == {0: (0, 10001), 1: (0, 10000), 2: (0, 9999)}
+    assert found.text[2] == 'a' * 5000
+
+
+def test_memo_empty_repetition_stops():
+    assert parse('(a*)*b').memo_match('aab').text[0] == 'aab'
+
+
+COMPILE_CASES = [
+    ('a', 'baab'),
+    ('a*b', 'xaab'),
+    ('a*', 'bbb'),
+    ('a(bb)*a(c|d|e|fg)hij', 'abbbbafghij trailing'),
+    ('a(bb)*a(c|d|e|fg)hij', 'aafghij trailing'),
+    ('(a|ab)(c|bcd)(d*)', 'abcdx'),
+    ('a((b)c)', 'xabc'),
+    ('((a)b)*c', 'xababc'),
+    ('abc', 'ababx'),
+]
+
+
+def test_compiled_same_as_match():
+    for expr, text in COMPILE_CASES:
+        expected = parse(expr).match(text)
+        found = compile(expr).match(text)
+        if expected is None:
+            assert found is None
+        else:
+            assert found.text == expected.text
+            assert found.extents == expected.extents
+
+
+def test_compiled_bytes():
+    found = compile('a(bb)*a(c|d|e|fg)hij').match(
+        memoryview(b'xx abbafghij'))
+    assert found.text == {0: b'abbafghij', 1: b'bb', 2: b'fg'}
+    assert compile('€').match('€'.encode('utf-8')) is None
+
+
+def test_compiled_end_of_input():
+    assert compile('ab').match('xa') is None
+
+
+def test_compile_cached():
+    assert compile('a(b|c)') is compile('a(b|c)')
+
+
+PARSE_CASES = [
+    'a', 'abc', 'a*b', 'a**', '*a', 'a|b|c', 'a|', '|a', '()', '(a)',
+    'a(bb)*a(c|d|e|fg)hij', '((a)b)*c', '(a|ab)(c|bcd)(d*)', 'a)b',
+    '(a*)*b',
+]
+
+
+def test_parse_iterative_same_tree():
+    for expr in PARSE_CASES:
+        assert str(parse_iterative(expr)) == str(parse(expr))
+
+
+def test_parse_iterative_unbalanced():
+    with pytest.raises(ValueError):
+        parse_iterative('a(b')
+
+
+def test_backtracker_same_as_match():
+    for expr, text in COMPILE_CASES:
+        expected = parse(expr).match(text)
+        found = Backtracker(parse(expr)).match(text)
+        if expected is None:
+            assert found is None
+        else:
+            assert found.text == expected.text
+            assert found.extents == expected.extents
+
+
+def test_backtracker_deep_pattern():
+    depth = 2000
+    expr = '(' * depth + 'a' + ')' * depth + 'b' * depth
+    found = Backtracker(parse_iterative(expr)).match('x' + 'a' + 'b' * depth)
+    assert found.extents[0] == (1, depth + 2)
+    assert found.text[depth] == 'a'
+
+
+def test_backtracker_long_input():
+    found = Backtracker(parse_iterative('a(b|c)*d')).match(
+        memoryview(b'a' + b'bc' * 5000 + b'd'))
+    assert found.extents[0] == (0, 10002)
+    assert found.text[1] == b'bc' * 5000
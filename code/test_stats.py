@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import sys
+import threading
+
+import pytest
+
+import nfa
+import pike
+import recursive_descent
+import stats
+import tracing
+
+
+def test_nfa_counts():
+    p = nfa.compile('(a|aa)*b')
+    m, s = stats.run(p.search, 'aaaab')
+    assert m.text[0] == 'aaaab'
+    assert m.stats is s
+    assert s.calls == 1
+    assert s.nfa_steps == 5
+    assert s.peak_paths > 1
+    assert s.time > 0
+    # Deduplicating keeps fewer paths alive.
+    s2 = stats.run(nfa.compile('(a|aa)*b', dedupe=True).search, 'aaaab')[1]
+    assert s2.peak_paths < s.peak_paths
+
+
+def test_recursive_descent_counts():
+    tree = recursive_descent.parse('a(b|c)*d')
+    m, s = stats.run(tree.match, 'abcbd')
+    assert m.text[0] == 'abcbd'
+    assert m.stats is s
+    assert s.rd_calls > 0
+    assert s.dupes > 0
+    assert s.backtracks == 0
+    bt = recursive_descent.Backtracker(tree)
+    s = stats.run(bt.match, 'xabcbd')[1]
+    assert s.backtracks > 0
+    assert s.rd_calls == 0
+
+
+def test_pike_depth():
+    found, s = stats.run(pike.match_iterative, 'ab*c', 'xabbbc')
+    assert found is True
+    assert s.pike_steps > 0
+    assert s.max_depth > 0
+    # The version from the article sends no events, so run() follows
+    # the calls to match_here() instead.
+    with contextlib.redirect_stdout(io.StringIO()):
+        found, s = stats.run(pike.match, 'ab*c', 'xabbbc')
+    assert found is True
+    # 'ab*c', then 'b*c' looping in match_star(), then 'c', then ''.
+    assert s.max_depth == 4
+    assert s.pike_steps > 4
+    assert pike.match_here.__name__ == 'match_here'
+    assert sys.getprofile() is None
+
+
+def test_pikevm_and_dfa_counts():
+    text = 'xx abbbbachij'
+    s = stats.run(nfa.compile('a(bb)*a(c|d)hij', engine='pikevm').search,
+                  text)[1]
+    assert s.pikevm_steps > 0
+    assert s.peak_threads > 0
+    p = nfa.compile('a(bb)*a(c|d)hij', engine='dfa')
+    s = stats.run(p.search, text, captures=False)[1]
+    assert s.cache_misses > 0
+    assert s.dfa_steps > 0
+    # The second time the transitions are already cached.
+    s = stats.run(p.search, text, captures=False)[1]
+    assert s.cache_misses == 0
+    assert s.cache_hits > 0
+
+
+def test_aggregate():
+    p = nfa.compile('ab*c')
+    total = stats.Stats()
+    for text in ['ac', 'abbbc', 'xyz']:
+        with stats.collect(total):
+            p.search(text)
+    assert total.calls == 3
+    assert total.steps > 0
+    # The prefilter skips 'xyz' without stepping through it.
+    assert total.nfa_steps == 2 + 5
+    each = [stats.run(p.search, text)[1] for text in ['ac', 'abbbc', 'xyz']]
+    combined = sum(each)
+    assert combined.calls == 3
+    assert combined.nfa_steps == total.nfa_steps
+    assert combined.peak_paths == max(s.peak_paths for s in each)
+    assert stats.Stats(nfa_steps=1) + stats.Stats(nfa_steps=2) == \
+        stats.Stats(nfa_steps=3)
+    assert repr(stats.Stats(dupes=2)) == 'Stats(dupes=2)'
+    with pytest.raises(ValueError):
+        stats.Stats(bogus=1)
+
+
+def test_existing_tracer_still_called():
+    recorder = tracing.Recorder()
+    with tracing.attached(recorder):
+        with stats.collect() as s:
+            nfa.compile('ab').search('ab')
+        assert tracing.current.get() is recorder
+    assert 'nfa.step' in recorder.names()
+    assert s.nfa_steps == 2
+
+
+def test_step_budget():
+    p = nfa.compile('(a|aa)*b')
+    with pytest.raises(stats.BudgetExceeded) as info:
+        stats.run(p.search, 'a' * 30 + 'b', max_steps=10000)
+    partial = info.value.stats
+    assert partial.steps > 10000
+    assert partial.calls == 1
+    assert partial.peak_paths > 100
+    assert tracing.current.get() is None
+    # Deduplicating keeps the work linear, so it fits.
+    p = nfa.compile('(a|aa)*b', dedupe=True)
+    m = stats.run(p.search, 'a' * 30 + 'b', max_steps=10000)[0]
+    assert m.text[0] == 'a' * 30 + 'b'
+
+
+def test_budget_every_engine():
+    tree = recursive_descent.parse('(a|b)*c')
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(tree.match, 'ab' * 50 + 'x', max_steps=500)
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(recursive_descent.Backtracker(tree).match,
+                  'ab' * 50 + 'x', max_steps=50)
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(pike.match_iterative, 'a*a*b', 'a' * 50, max_steps=100)
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(nfa.compile('(a|b)*c', engine='pikevm').search,
+                  'ab' * 50 + 'c', max_steps=100)
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(tree.memo_match, 'ab' * 50 + 'x', max_steps=50)
+    with pytest.raises(stats.BudgetExceeded):
+        stats.run(recursive_descent.compile('(a|b)*c').match,
+                  'ab' * 50 + 'x', max_steps=50)
+    # The DFA engines are stopped part way through the scan.
+    for engine in ('dfa', 'bitparallel'):
+        p = nfa.compile('(a|b)*c', engine=engine)
+        with pytest.raises(stats.BudgetExceeded) as info:
+            stats.run(p.search, 'ab' * 500 + 'c', captures=False,
+                      max_steps=100)
+        assert info.value.stats.dfa_steps <= 101
+
+
+def test_budget_pike_article():
+    with contextlib.redirect_stdout(io.StringIO()):
+        with pytest.raises(stats.BudgetExceeded) as info:
+            stats.run(pike.match, 'a*a*a*a*a*a*a*b', 'a' * 30 + 'c',
+                      max_steps=1000)
+        assert info.value.stats.pike_steps == 1001
+        with pytest.raises(stats.BudgetExceeded) as info:
+            stats.run(pike.match, 'a*a*a*a*a*a*a*b', 'a' * 30 + 'c',
+                      timeout=0.05)
+    assert str(info.value) == 'out of time'
+    assert sys.getprofile() is None
+
+
+def test_timeout():
+    with pytest.raises(stats.BudgetExceeded) as info:
+        stats.run(nfa.compile('(a|aa)*b').search, 'a' * 30 + 'b',
+                  timeout=0.05)
+    assert str(info.value) == 'out of time'
+    assert info.value.stats.time >= 0.05
+
+
+def test_budget_is_per_call():
+    p = nfa.compile('ab*c')
+    total = stats.Stats()
+    for _ in range(10):
+        with stats.collect(total, max_steps=20) as s:
+            p.search('abbbbbc')
+        assert s.steps <= 20
+    assert total.steps > 20
+    assert total.calls == 10
+
+
+def test_threads_are_kept_apart():
+    p = nfa.compile('(a|aa)*b')
+    started = threading.Event()
+    done = threading.Event()
+    found = {}
+
+    def other():
+        # No budget applies here, and the events are not counted by
+        # the Stats in the main thread.
+        started.set()
+        found['match'] = p.search('a' * 12 + 'b')
+        done.set()
+
+    thread = threading.Thread(target=other)
+    with stats.collect(max_steps=100000) as s:
+        thread.start()
+        started.wait()
+        done.wait()
+        p.search('ab')
+    thread.join()
+    assert found['match'].text[0] == 'a' * 12 + 'b'
+    assert s.nfa_steps == 2
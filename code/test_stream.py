@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import io
+
+import nfa
+import stream
+
+
+def _all_spans(pattern, text):
+    # Repeated searches, each starting where the last match ended.
+    p = nfa.compile(pattern, engine='pikevm')
+    spans = []
+    pos = 0
+    while True:
+        m = p.vm.search(text, pos)
+        if m is None:
+            return spans
+        spans.append(m.extents[0])
+        pos = m.extents[0][1]
+
+
+def _feed(pattern, text, size):
+    matcher = stream.StreamMatcher(pattern)
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(matcher.feed(text[i:i + size]))
+    found.extend(matcher.finish())
+    return found
+
+
+CASES = [
+    ('ab', 'xxabxxabab'),
+    ('a+b', 'aab ab aaaab b'),
+    ('a(bb)*a', 'abbabbbbaaa'),
+    ('ERROR(a|b)*', 'ERRORab ERRORba ERROR'),
+    ('(a|ab)(c|bcd)', 'abcd abc'),
+    # A later start matches while an earlier one is still running.
+    ('((bac)|a)', 'baacbaccbaac'),
+    ('((b)?abc|b)', 'bbcaabcaccba'),
+]
+
+
+def test_same_as_repeated_search():
+    for pattern, text in CASES:
+        expected = _all_spans(pattern, text)
+        for size in (1, 2, 3, len(text)):
+            found = _feed(pattern, text, size)
+            assert [(m.start, m.end) for m in found] == expected
+            for m in found:
+                assert m.text == text[m.start:m.end]
+
+
+def test_match_reported_before_finish():
+    matcher = stream.StreamMatcher('ab')
+    assert matcher.feed('xa') == []
+    assert matcher.feed('bx') == [stream.StreamMatch(1, 3, 'ab')]
+    assert matcher.finish() == []
+
+
+def test_buffer_stays_small():
+    matcher = stream.StreamMatcher('abc')
+    for _ in range(1000):
+        matcher.feed('xxxxxxxxab')
+        # Only the 'ab' that might start a match is kept.
+        assert len(matcher.buffer) == 2
+
+
+def test_iter_matches_file():
+    f = io.StringIO('one ERRORa two ERRORbb three' * 10)
+    found = list(stream.iter_matches('ERROR(a|b)*', f, chunk_size=7))
+    assert len(found) == 20
+    assert found[0] == stream.StreamMatch(4, 10, 'ERRORa')
+
+
+def test_bytes_chunks():
+    text = b'x ab abbba ba aa'
+    assert _feed('ab*a', text, 3) == [
+        (start, end, text[start:end])
+        for start, end, _ in _feed('ab*a', text.decode('ascii'), 3)
+    ]
+
+
+def test_earlier_thread_outlives_candidate():
+    f = io.BytesIO(b'baacbaccbaac')
+    found = list(stream.iter_matches('((bac)|a)', f, chunk_size=3))
+    assert (4, 7, b'bac') in found
+    for m in found:
+        assert m.text == b'baacbaccbaac'[m.start:m.end]
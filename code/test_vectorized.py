@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import vectorized
+
+
+PATTERN = 'a(bb)*a(c|d|e|fg)hij'
+
+STRINGS = [
+    'aafghij',
+    'nothing here',
+    'xx abbbbachij',
+    '',
+    'abbaeh',
+    'abbbafghij',
+    'aafghi€j',
+    'zzaachij',
+]
+
+EXPECTED = [True, False, True, False, False, False, False, True]
+
+
+def test_pure_python():
+    assert vectorized.match_mask(PATTERN, STRINGS, use_numpy=False) == \
+        EXPECTED
+
+
+def test_numpy():
+    pytest.importorskip('numpy')
+    mask = vectorized.match_mask(PATTERN, STRINGS, batch_size=3)
+    assert mask.tolist() == EXPECTED
+
+
+def test_numpy_bytes():
+    pytest.importorskip('numpy')
+    strings = [s.encode('utf-8') for s in STRINGS] + [b'aachij\0\0']
+    mask = vectorized.match_mask(PATTERN, strings)
+    assert mask.tolist() == EXPECTED + [True]
+
+
+def test_numpy_padding_does_not_match():
+    pytest.importorskip('numpy')
+    # The padding is NUL, so a pattern for NUL must not match it.
+    mask = vectorized.match_mask('a\0', ['a', 'a\0', 'ba'])
+    assert mask.tolist() == [False, True, False]
+
+
+def test_numpy_long_strings_checked_one_at_a_time():
+    pytest.importorskip('numpy')
+    strings = STRINGS + ['x' * 50 + 'aachij', 'x' * 50]
+    mask = vectorized.match_mask(PATTERN, strings, batch_size=2,
+                                 max_width=10)
+    assert mask.tolist() == EXPECTED + [True, False]
+    mask = vectorized.match_mask(PATTERN, strings, max_width=0)
+    assert mask.tolist() == EXPECTED + [True, False]
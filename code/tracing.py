@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Optional tracing for the matchers.
+#
+# The inner loops of the matchers report what they are doing by
+# calling the active tracer with an event name and keyword arguments
+# describing the step. When no tracer is attached the only cost is
+# checking whether the tracer is None, so no strings are built unless
+# someone is going to look at them.
+#
+# The active tracer is kept in a context variable, so each thread (and
+# each asyncio task) has its own. Attaching a tracer in one thread
+# does not trace, or slow down, the matches running in another.
+#
+# To see the same debug output the matchers used to log directly,
+# attach a LoggingTracer:
+#
+#   with tracing.attached(tracing.LoggingTracer()):
+#       nfa.match('a(b|c)', 'abc')
+
+import contextlib
+import contextvars
+import logging
+
+# The active tracer, or None when tracing is off. A tracer is any
+# callable accepting an event name and keyword arguments. Look it up
+# with current.get().
+current = contextvars.ContextVar('tracer', default=None)
+
+
+def set_tracer(new):
+    "Make new the active tracer and return the previous one."
+    old = current.get()
+    current.set(new)
+    return old
+
+
+@contextlib.contextmanager
+def attached(new):
+    "Use new as the active tracer inside a with statement."
+    token = current.set(new)
+    try:
+        yield new
+    finally:
+        current.reset(token)
+
+
+class Recorder:
+    "A tracer that remembers every event it sees."
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, **fields):
+        self.events.append((event, fields))
+
+    def names(self):
+        return [event for event, fields in self.events]
+
+
+class LoggingTracer:
+    """A tracer that turns events into debug log messages.
+
+    Each event is handled by the method with the same name, with the
+    dot replaced by an underscore. Events without a method are
+    ignored.
+    """
+
+    def __init__(self, log=logging.debug):
+        self.log = log
+
+    def __call__(self, event, **fields):
+        handler = getattr(self, event.replace('.', '_'), None)
+        if handler is not None:
+            handler(**fields)
+
+    # nfa.py
+
+    def nfa_set_out(self, state, which, target):
+        self.log('set_out{}({}, {})'.format(which, state.n, target.n))
+
+    def nfa_match(self, s, start):
+        self.log('\nmatch checking {!r}'.format(s))
+
+    def nfa_search(self, s):
+        self.log('\nsearch checking {!r}'.format(s))
+
+    def nfa_char(self, i, c):
+        self.log('\nmatch i={} c={}'.format(i, c))
+
+    def nfa_no_paths(self):
+        self.log('no more paths')
+
+    def nfa_found(self, i, path):
+        self.log('found match state at {} from {}'.format(i, path.start))
+
+    def nfa_matched(self, paths):
+        self.log('\nfound {} paths'.format(len(paths)))
+        for m in paths:
+            self.log('  {} {} {}'.format(m.length(), m, m.matches()))
+
+    def nfa_next_paths(self, path):
+        self.log('next_paths {} {}'.format(
+            path.state,
+            path.prev.as_chain() if path.prev else None,
+        ))
+
+    def nfa_step(self, paths, c, i):
+        self.log('step {} {} {}'.format(
+            [(p.state.n, p.state.token.text) for p in paths], c, i))
+
+    def nfa_consume(self, state):
+        self.log('stepping {} {}'.format(state.n, state.token.groups))
+
+    def nfa_group(self, path):
+        self.log('_handle_groups {} {} {} {}'.format(
+            path.state.n,
+            path.state.token.op,
+            path.c,
+            path.state.token.groups,
+        ))
+
+    def nfa_extent(self, group, start, end):
+        self.log('  extent {}: {}, {}'.format(group, start, end))
+
+    # recursive_descent.py
+
+    def rd_match(self, node, text, start):
+        self.log('{}.match({!r}, {})'.format(node, text, start))
+
+    def rd_add(self, match, substr, start, end, groups):
+        self.log('Match.add({!r}, {}, {}, {})'.format(
+            substr, start, end, groups))
+        self.log('  before text: {}'.format(match.text))
+        self.log('  before extents: {}'.format(match.extents))
+
+    def rd_extent(self, group, start, end):
+        self.log('  extent {}: {}, {}'.format(group, start, end))
+
+    def rd_added(self, match):
+        self.log('  after text: {}'.format(match.text))
+        self.log('  after extents: {}'.format(match.extents))
+
+    # pikevm.py
+
+    def pikevm_match(self, i, start):
+        self.log('match at {} from {}'.format(i, start))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Check many short strings against one pattern at the same time.
+#
+# The strings are packed into a matrix with one row per string, padded
+# at the end, and the DFA from dfa.py is run down the columns. Each
+# step looks up the next state of every row at once:
+#
+#   state = table[state, classes[:, i]]
+#
+# so the loop runs once per column instead of once per character. This
+# needs NumPy. Without it the strings are checked one at a time with
+# the same DFA.
+#
+# Every row of a matrix is as wide as the longest string in it, so the
+# strings are sorted by length before they are split into batches, and
+# the few that are too long to be worth padding to are checked one at
+# a time.
+
+import dfa
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The number of strings packed into each matrix.
+DEFAULT_BATCH_SIZE = 65536
+
+# Strings longer than this are not packed into a matrix.
+DEFAULT_MAX_WIDTH = 256
+
+
+def match_mask(pattern, strings, use_numpy=None,
+               batch_size=DEFAULT_BATCH_SIZE, max_width=DEFAULT_MAX_WIDTH):
+    """Return which of the strings pattern matches somewhere in.
+
+    strings may be str or bytes. The result is a NumPy array of bools
+    when NumPy is used and a list of bools otherwise. By default NumPy
+    is used if it can be imported. Strings longer than max_width are
+    checked one at a time even then.
+    """
+    d = dfa.from_pattern(pattern, unanchored=True)
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if not use_numpy:
+        return [d.search_end(s, 0) >= 0 for s in strings]
+    if numpy is None:
+        raise ValueError('NumPy is not available')
+
+    strings = list(strings)
+    lookup = _ClassLookup(d)
+    table = numpy.frombuffer(d.table, dtype=numpy.intc).reshape(
+        d.nstates, d.nclasses)
+    accept = numpy.frombuffer(d.accept, dtype=numpy.int8).astype(bool)
+    lengths = numpy.array([len(s) for s in strings], dtype=numpy.intp)
+    matched = numpy.zeros(len(strings), dtype=bool)
+    order = numpy.argsort(lengths, kind='stable')
+    packed = int(numpy.searchsorted(lengths[order], max_width, 'right'))
+    for i in range(0, packed, batch_size):
+        rows = order[i:min(i + batch_size, packed)]
+        matched[rows] = _run(d, table, accept, lookup,
+                             [strings[r] for r in rows], lengths[rows])
+    for r in order[packed:]:
+        matched[r] = d.search_end(strings[r], 0) >= 0
+    return matched
+
+
+class _ClassLookup:
+    "Map arrays of code points to the character classes of a DFA."
+
+    def __init__(self, d):
+        codes = sorted(d.classes)
+        self.codes = numpy.array(codes, dtype=numpy.uint32)
+        self.classes = numpy.array([d.classes[c] for c in codes],
+                                   dtype=numpy.intp)
+
+    def __call__(self, chars):
+        if not len(self.codes):
+            return numpy.full(chars.shape, dfa.OTHER, dtype=numpy.intp)
+        where = numpy.searchsorted(self.codes, chars)
+        where = numpy.minimum(where, len(self.codes) - 1)
+        known = self.codes[where] == chars
+        return numpy.where(known, self.classes[where], dfa.OTHER)
+
+
+def _run(d, table, accept, lookup, strings, lengths):
+    classes = lookup(_encode(strings))
+    state = numpy.full(len(strings), d.start, dtype=numpy.intp)
+    matched = numpy.zeros(len(strings), dtype=bool)
+    for i in range(classes.shape[1]):
+        state = table[state, classes[:, i]]
+        # The padding after the end of a string must not count.
+        matched |= accept[state] & (i < lengths)
+    return matched
+
+
+def _encode(strings):
+    """Return a matrix of the code points in strings, one row each,
+    padded with zeros."""
+    if strings and isinstance(strings[0], str):
+        # Fixed width unicode arrays already hold one 32 bit code
+        # point per character.
+        packed = numpy.array(strings, dtype=str)
+        width = packed.dtype.itemsize // 4
+        return packed.view(numpy.uint32).reshape(len(strings), width)
+    # Fixed width byte strings drop trailing NUL bytes, so copy the
+    # rows in one at a time instead.
+    width = max((len(s) for s in strings), default=0)
+    chars = numpy.zeros((len(strings), width), dtype=numpy.uint8)
+    for row, s in enumerate(strings):
+        chars[row, :len(s)] = numpy.frombuffer(bytes(s), dtype=numpy.uint8)
+    return chars